@@ -258,3 +258,17 @@ def search_status(status_id, status_collection):
         return False
     # search for status if verified
     return status_collection.search_status(status_id)
+
+def search_all_status_updates(user_id, status_collection):
+    """
+    Finds all status updates for a user
+    """
+    # search the status collection for all updates
+    return status_collection.search_all_status_updates(user_id)
+
+def filter_status_by_string(phrase, status_collection):
+    """
+    Returns all statuses that contain a phrase
+    """
+    # search the status collection for statuses with the phrase
+    return status_collection.filter_status_by_string(phrase)
@@ -5,7 +5,7 @@ Test class to test user_status.py
 import unittest
 from peewee import SqliteDatabase
 import user_status
-from socialnetwork_model import UserModel, StatusModel
+from socialnetwork_model import UserModel, StatusModel, explain, migrate
 
 class TestUserStatus(unittest.TestCase):
     """
@@ -179,3 +179,49 @@ class TestUserStatus(unittest.TestCase):
         response = self.status_collection.search_status(search_status_id)
         # assure status was not found
         self.assertEqual(response, False)
+
+    def test_statuscollect_search_all_status_updates(self):
+        """
+        Test for StatusCollection's search_all_status_updates method
+        """
+        # add a second status for testuser
+        self.status_collection.add_status("testuser_00002", "testuser", "My second post")
+        response = self.status_collection.search_all_status_updates("testuser")
+        # assure both status texts are found
+        self.assertEqual([status.status_text for status in response],
+                         ["My first status post", "My second post"])
+
+    def test_statuscollect_filter_status_by_string(self):
+        """
+        Test for StatusCollection's filter_status_by_string method
+        """
+        response = self.status_collection.filter_status_by_string("first")
+        # assure only the matching status is found
+        self.assertEqual([status.status_id for status in response], ["testuser_00001"])
+
+    def test_status_queries_use_indexes(self):
+        """
+        Test that the status lookups search an index instead of scanning
+        """
+        queries = [self.status_collection.search_all_status_updates("testuser"),
+                   StatusModel.select().where(StatusModel.status_id == "testuser_00001")]
+        for query in queries:
+            plan = explain(query, self.database)
+            # assure no step reads the whole table
+            self.assertTrue(all(step.startswith("SEARCH") for step in plan), plan)
+        # assure a user's statuses are read from the covering index alone
+        plan = explain(queries[0], self.database)
+        self.assertIn("USING COVERING INDEX statusmodel_user_id_status_id_status_text", plan[0])
+
+    def test_migrate(self):
+        """
+        Test that migrate replaces the old foreign key index and can run twice
+        """
+        # recreate the index the old schema had on user_id
+        self.database.execute_sql('CREATE INDEX "statusmodel_user_id" ON "statusmodel" ("user_id")')
+        migrate(self.database)
+        migrate(self.database)
+        indexes = [index.name for index in self.database.get_indexes("statusmodel")]
+        # assure only the covering index is left
+        self.assertIn("statusmodel_user_id_status_id_status_text", indexes)
+        self.assertNotIn("statusmodel_user_id", indexes)
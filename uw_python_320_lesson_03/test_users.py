@@ -5,7 +5,7 @@ Test class to test users.py
 import unittest
 from peewee import SqliteDatabase
 import users
-from socialnetwork_model import UserModel
+from socialnetwork_model import UserModel, explain
 
 class TestUsers(unittest.TestCase):
     """
@@ -129,6 +129,18 @@ class TestUsers(unittest.TestCase):
         # assure user was found
         self.assertEqual(response.user_id, search_id)
 
+    def test_usercollect_search_reuses_sql(self):
+        """
+        Test that each search swaps its own user_id into the compiled sql
+        """
+        # add a second user with a quote in the id
+        self.user_collection.add_user("o'brien", "obrien@user.com", "miles", "obrien")
+        search_sql = self.user_collection.search_sql
+        # assure each search finds its own user
+        self.assertEqual(self.user_collection.search_user("o'brien").user_id, "o'brien")
+        self.assertEqual(self.user_collection.search_user("testuser").user_id, "testuser")
+        self.assertEqual(self.user_collection.search_sql, search_sql)
+
     def test_usercollect_search_invalid_user(self):
         """
         Test for UserCollection's search_user method with an invalid user
@@ -139,3 +151,11 @@ class TestUsers(unittest.TestCase):
         response = self.user_collection.search_user(search_id)
         # assure user was not found
         self.assertEqual(response, False)
+
+    def test_usercollect_search_uses_index(self):
+        """
+        Test that a user lookup searches the primary key instead of scanning
+        """
+        plan = explain(UserModel.select().where(UserModel.user_id == "testuser"), self.database)
+        # assure no step reads the whole table
+        self.assertTrue(all(step.startswith("SEARCH") for step in plan), plan)
@@ -4,8 +4,9 @@ classes to manage the user status messages
 # pylint: disable=R0903, E0401
 import logging
 from datetime import datetime
-from peewee import IntegrityError, DoesNotExist
+from peewee import IntegrityError
 from socialnetwork_model import StatusModel
+from users import LOOKUP_KEY
 
 # set up logging for user_status file
 log_file_name = "log_" + datetime.now().strftime("%m_%d_%Y")
@@ -25,6 +26,9 @@ class UserStatusCollection():
 
     def __init__(self, database):
         self.database = database
+        # peewee compiles the lookup once here instead of on every search
+        self.search_sql, self.search_params = StatusModel.select().where(
+            StatusModel.status_id == LOOKUP_KEY).sql()
         logger.debug("Status database successfully linked")
 
     def add_status(self, status_id, user_id, status_text):
@@ -32,17 +36,14 @@ class UserStatusCollection():
         add a new status message to the collection
         '''
         try:
-            with self.database.transaction():
-                # create a row for the status ID in the database
-                result = StatusModel.create(
-                    status_id = status_id,
-                    user_id = user_id,
-                    status_text = status_text
-                )
-                # save new row
-                result.save()
-                logger.debug("Status ID %s successfully added", status_id)
-                return True
+            # insert a row for the status ID with a single statement
+            StatusModel.insert(
+                status_id = status_id,
+                user_id = user_id,
+                status_text = status_text
+            ).execute()
+            logger.debug("Status ID %s successfully added", status_id)
+            return True
         # IntegrityError catches duplicate status_ids
         except IntegrityError:
             # not necessarily true. may be a foreign key error
@@ -54,58 +55,78 @@ class UserStatusCollection():
         Modifies a status message
 
         The new user_id and status_text are assigned to the existing message
+        with one UPDATE statement, the status exists if it changed a row.
         '''
         try:
-            with self.database.transaction():
-                # get status ID to modify
-                result = self.search_status(status_id)
-                if result:
-                    # modify ID that was fetched
-                    result.user_id = user_id
-                    result.status_text = status_text
-                    # save updated row
-                    result.save()
-                    logger.debug("Status ID %s successfully modified", status_id)
-                    return True
-                # return False if result is not found
-                logger.debug("Status ID %s cannot be deleted as it does not exist", status_id)
-                return False
+            rowcount = StatusModel.update(
+                user_id = user_id,
+                status_text = status_text
+            ).where(StatusModel.status_id == status_id).execute()
         # catches foreign keys that do not exist
         except IntegrityError:
             logger.debug("User ID %s does not exist as a foreign key", user_id)
             return False
+        if rowcount:
+            logger.debug("Status ID %s successfully modified", status_id)
+            return True
+        # return False if no row has the status ID
+        logger.debug("Status ID %s cannot be modified as it does not exist", status_id)
+        return False
 
 
     def delete_status(self, status_id):
         '''
         deletes the status message with id, status_id
+
+        One DELETE statement, the status existed if it removed a row.
         '''
-        with self.database.transaction():
-            # get status ID to delete
-            result = self.search_status(status_id)
-            if result:
-                # delete ID that was fetched
-                result.delete_instance()
-                logger.debug("Status ID %s successfully deleted", status_id)
-                return True
-            # return False if result is not found
-            logger.debug("Status ID %s cannot be deleted as it does not exist", status_id)
-            return False
+        rowcount = StatusModel.delete().where(StatusModel.status_id == status_id).execute()
+        if rowcount:
+            logger.debug("Status ID %s successfully deleted", status_id)
+            return True
+        # return False if no row has the status ID
+        logger.debug("Status ID %s cannot be deleted as it does not exist", status_id)
+        return False
 
     def search_status(self, status_id):
         '''
         Find and return a status message by its status_id
 
-        Returns an empty UserStatus object if status_id does not exist
+        Returns False if status_id does not exist. Runs the sql compiled
+        in __init__ with status_id swapped in, which skips peewee building
+        the query on every call. A single read needs no transaction, so
+        it runs in sqlite's implicit one.
         '''
-        try:
-            with self.database.transaction():
-                # get row with status_id
-                result = StatusModel.get(StatusModel.status_id == status_id)
-                # return row that was fetched
-                logger.debug("Status ID %s successfully found", status_id)
-                return result
-        # DoesNotExist catches if the status_id does not exist
-        except DoesNotExist:
+        # get row with status_id
+        params = [status_id if param == LOOKUP_KEY else param for param in self.search_params]
+        result = next(iter(StatusModel.raw(self.search_sql, *params)), None)
+        if result is None:
             logger.debug("Status ID %s cannot be found", status_id)
             return False
+        # return row that was fetched
+        logger.debug("Status ID %s successfully found", status_id)
+        return result
+
+    def search_all_status_updates(self, user_id):
+        """
+        Returns all status updates for a user
+
+        Only the user_id, status_id, status_text index is read.
+        """
+        # find all status texts under user_id
+        results = StatusModel.select(StatusModel.status_text).where(
+            StatusModel.user_id == user_id)
+        # return all status texts with that user ID
+        return results
+
+    def filter_status_by_string(self, phrase):
+        """
+        Returns all statuses that contain the phrase
+
+        A LIKE with a leading wildcard can't use an index, so this
+        reads every status.
+        """
+        # find all statuses that contain the phrase
+        results = StatusModel.select().where(StatusModel.status_text.contains(phrase))
+        # return all statuses with the phrase
+        return results
@@ -293,3 +293,10 @@ def filter_status_by_string(phrase, status_collection):
     """
     # search the status collection for statuses with the phrase
     return status_collection.filter_status_by_string(phrase)
+
+def search_status_text(query, status_collection, limit = 20):
+    """
+    Returns the statuses that best match a full text query
+    """
+    # search the full text index of status texts
+    return status_collection.search_status_text(query, limit)
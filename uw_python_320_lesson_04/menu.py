@@ -219,6 +219,18 @@ def flagged_status_updates():
     for status_tuple in [(result.status_id, result.status_text) for result in results]:
         print(status_tuple)
 
+def search_status_text():
+    """
+    Prints the statuses that best match a full text search
+    """
+    query = input('Search words (word* matches a prefix, "a phrase" matches in order): ')
+    results = main.search_status_text(query, status_collection)
+    # print out (status_id, status_text) for the best matches
+    for result in results:
+        print((result.status_id, result.status_text))
+    if not results:
+        print("No statuses matched the search")
+
 def quit_program():
     '''
     Quits program
@@ -243,6 +255,7 @@ if __name__ == '__main__':
         'K': filter_status_by_string,
         'L': flagged_status_updates,
         'M': delete_status,
+        'N': search_status_text,
         'Q': quit_program
     }
     while True:
@@ -260,6 +273,7 @@ if __name__ == '__main__':
                             K: Search all status updates matching a string
                             L: Show all flagged status updates
                             M: Delete status
+                            N: Full text search of status updates
                             Q: Quit
 
                             Please enter your choice: """).upper()
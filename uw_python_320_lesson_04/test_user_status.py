@@ -3,9 +3,10 @@ Test class to test user_status.py
 """
 # pylint: disable=R0903, E0401
 import unittest
+from unittest.mock import patch
 from peewee import SqliteDatabase
 import user_status
-from socialnetwork_model import UserModel, StatusModel
+from socialnetwork_model import UserModel, StatusModel, create_status_search, vacuum
 
 class TestUserStatus(unittest.TestCase):
     """
@@ -20,6 +21,7 @@ class TestUserStatus(unittest.TestCase):
         self.database.bind([UserModel, StatusModel])
         self.database.connect()
         self.database.create_tables([UserModel, StatusModel])
+        create_status_search(self.database)
         self.status_collection = user_status.UserStatusCollection(self.database)
         # create test user_id so it can be used as a foreign key
         user_id = "testuser"
@@ -179,3 +181,60 @@ class TestUserStatus(unittest.TestCase):
         response = self.status_collection.search_status(search_status_id)
         # assure status was not found
         self.assertEqual(response, False)
+
+    def test_statuscollect_search_status_text(self):
+        """
+        Test for StatusCollection's search_status_text method with fts5
+        """
+        self.status_collection.add_status("testuser_00002", "testuser", "Sunny in Seattle")
+        self.status_collection.add_status("testuser_00003", "testuser",
+                                          "Seattle is sunny, sunny, sunny")
+        # assure the status that uses the word most ranks first
+        response = self.status_collection.search_status_text("sunny")
+        self.assertEqual([status.status_id for status in response],
+                         ["testuser_00003", "testuser_00002"])
+        # assure prefixes and phrases match
+        response = self.status_collection.search_status_text("sea*")
+        self.assertEqual(len(response), 2)
+        response = self.status_collection.search_status_text('"sunny in seattle"')
+        self.assertEqual([status.status_id for status in response], ["testuser_00002"])
+        # assure the limit is applied
+        self.assertEqual(len(self.status_collection.search_status_text("sunny", limit = 1)), 1)
+
+    def test_statuscollect_search_status_text_stays_in_sync(self):
+        """
+        Test that search_status_text follows modified and deleted statuses
+        """
+        self.status_collection.modify_status("testuser_00001", "testuser", "Second thoughts")
+        self.assertEqual(self.status_collection.search_status_text("first"), [])
+        self.assertEqual(len(self.status_collection.search_status_text("thoughts")), 1)
+        self.status_collection.delete_status("testuser_00001")
+        self.assertEqual(self.status_collection.search_status_text("thoughts"), [])
+
+    def test_statuscollect_search_status_text_after_vacuum(self):
+        """
+        Test that vacuum keeps search_status_text pointing at the right
+        statuses when statusmodel's rowids change
+        """
+        self.status_collection.add_status("testuser_00002", "testuser", "Sunny in Seattle")
+        # renumber the rows the way VACUUM may, which the triggers don't see
+        self.database.execute_sql('UPDATE "statusmodel" SET rowid = rowid + 10')
+        vacuum(self.database)
+        response = self.status_collection.search_status_text("seattle")
+        self.assertEqual([status.status_id for status in response], ["testuser_00002"])
+
+    def test_statuscollect_search_status_text_bad_syntax(self):
+        """
+        Test that a query that isn't valid fts5 syntax searches its words
+        """
+        response = self.status_collection.search_status_text('first "status')
+        self.assertEqual([status.status_id for status in response], ["testuser_00001"])
+
+    def test_statuscollect_search_status_text_without_fts5(self):
+        """
+        Test that search_status_text falls back to LIKE without fts5
+        """
+        with patch("user_status.has_status_search", return_value = False):
+            response = self.status_collection.search_status_text("first stat*")
+        self.assertFalse(self.status_collection.full_text)
+        self.assertEqual([status.status_id for status in response], ["testuser_00001"])
@@ -129,6 +129,18 @@ class TestUsers(unittest.TestCase):
         # assure user was found
         self.assertEqual(response.user_id, search_id)
 
+    def test_usercollect_search_reuses_sql(self):
+        """
+        Test that each search swaps its own user_id into the compiled sql
+        """
+        # add a second user with a quote in the id
+        self.user_collection.add_user("o'brien", "obrien@user.com", "miles", "obrien")
+        search_sql = self.user_collection.search_sql
+        # assure each search finds its own user
+        self.assertEqual(self.user_collection.search_user("o'brien").user_id, "o'brien")
+        self.assertEqual(self.user_collection.search_user("testuser").user_id, "testuser")
+        self.assertEqual(self.user_collection.search_sql, search_sql)
+
     def test_usercollect_search_invalid_user(self):
         """
         Test for UserCollection's search_user method with an invalid user
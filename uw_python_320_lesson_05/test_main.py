@@ -162,16 +162,20 @@ class TestMainUserData(unittest.TestCase):
         """
         # create mock user collection
         mock_user_collection = Mock()
-        mock_user_collection.delete_user = Mock(return_value = True)
+        mock_user_collection.delete_users = Mock(return_value = 1)
         mock_status_collection = Mock()
         # bypass verify input functions
         with patch("verify_input.verify_user_id", return_value = [True, ""]):
-            with patch("main.search_all_status_updates", return_value = (None, [])):
+            # run the deletes without a transaction
+            with patch("main.run_in_transaction",
+                       side_effect = lambda client, operation: operation(None)):
                 # delete user from database
                 response = main.delete_user("testuser", mock_user_collection,
                                             mock_status_collection)
-                # make sure delete user is called once
-                mock_user_collection.delete_user.assert_called_once_with("testuser")
+                # make sure the user and their statuses are deleted once
+                mock_user_collection.delete_users.assert_called_once_with(["testuser"], None)
+                mock_status_collection.delete_user_statuses.assert_called_once_with(
+                    ["testuser"], None)
                 # make sure it was deleted
                 self.assertEqual(response, True)
 
@@ -181,18 +185,41 @@ class TestMainUserData(unittest.TestCase):
         """
         # create mock user collection
         mock_user_collection = Mock()
-        mock_user_collection.delete_user = Mock(return_value = False)
+        mock_user_collection.delete_users = Mock(return_value = 0)
         mock_status_collection = Mock()
         # bypass verify input functions
         with patch("verify_input.verify_user_id", return_value = [True, ""]):
-            with patch("main.search_all_status_updates", return_value = (None, [])):
+            # run the deletes without a transaction
+            with patch("main.run_in_transaction",
+                       side_effect = lambda client, operation: operation(None)):
                 # delete user from database
                 response = main.delete_user("testing", mock_user_collection, mock_status_collection)
-                # make sure delete user is called once
-                mock_user_collection.delete_user.assert_called_once_with("testing")
-                # make sure it was deleted
+                # make sure delete users is called once
+                mock_user_collection.delete_users.assert_called_once_with(["testing"], None)
+                # make sure it was not deleted
                 self.assertEqual(response, False)
 
+    def test_delete_users(self):
+        """
+        Test for main's delete_users function with many IDs
+        """
+        # create mock user collection
+        mock_user_collection = Mock()
+        mock_user_collection.delete_users = Mock(return_value = 2)
+        mock_status_collection = Mock()
+        # run the deletes without a transaction
+        with patch("main.run_in_transaction",
+                   side_effect = lambda client, operation: operation(None)):
+            # delete users from database, skipping the invalid id
+            response = main.delete_users(["jakeh", "elizabethc", ""],
+                                         mock_user_collection, mock_status_collection)
+            # make sure both collections are only called once
+            mock_user_collection.delete_users.assert_called_once_with(
+                ["jakeh", "elizabethc"], None)
+            mock_status_collection.delete_user_statuses.assert_called_once_with(
+                ["jakeh", "elizabethc"], None)
+            self.assertEqual(response, 2)
+
     def test_search_user_valid(self):
         """
         Test for main's search_users function with a valid ID
@@ -255,6 +282,8 @@ class TestMainStatusData(unittest.TestCase):
             main.init_status_collection(mock_client)
             # verify user collection object is created
             mock.assert_called_once()
+            # verify the status indexes are created once here
+            mock.return_value.ensure_indexes.assert_called_once()
 
     def test_load_status_updates_good_data(self):
         """
@@ -21,6 +21,7 @@ class TestUserStatus(unittest.TestCase):
         self.database = client.database
         self.user_collection = UserCollection(self.database["TestUserAccounts"])
         self.status_collection = UserStatusCollection(self.database["TestStatusUpdates"])
+        self.status_collection.ensure_indexes()
         # create test user to add to database
         user_id = "testuser"
         email = "test@user.com"
@@ -112,6 +113,38 @@ class TestUserStatus(unittest.TestCase):
         # assure status was not modified
         self.assertEqual(response, False)
 
+    def test_statuscollect_bulk_modify(self):
+        """
+        Test for StatusCollection's bulk_modify method with a good and bad status
+        """
+        # update the status text and try to update a status that DNE
+        updates = {"testuser_00001": {"status_text": "My first status post!!!!"},
+                   "testuser_99999": {"status_text": "this better not work"}}
+        response = self.status_collection.bulk_modify(updates)
+        # assure only the existing status was matched and modified
+        self.assertEqual(response, {"matched": 1, "modified": 1})
+        self.assertEqual(self.status_collection.search_status("testuser_00001")["status_text"],
+                         "My first status post!!!!")
+
+    def test_statuscollect_search_all_status_updates(self):
+        """
+        Test for StatusCollection's search_all_status_updates method with paging
+        """
+        # add a second status for testuser
+        self.status_collection.add_status("testuser_00002", "testuser", "My second post")
+        results = self.status_collection.search_all_status_updates(
+            "testuser", projection = ["status_text"])
+        # assure both statuses are counted and only the text is fetched
+        self.assertEqual(len(results), 2)
+        self.assertEqual([status["status_text"] for status in results],
+                         ["My first status post", "My second post"])
+        # assure the results can be looped over again
+        self.assertEqual(len(list(results)), 2)
+        # assure a page skips the first status
+        page = results.page(1, 1)
+        self.assertEqual(len(page), 1)
+        self.assertEqual([status["_id"] for status in page], ["testuser_00002"])
+
     # def test_statuscollect_modify_status_no_foreign_key(self):
     #     """
     #     Test for StatusCollection's modify_status method with an invalid foreign key
@@ -170,3 +203,14 @@ class TestUserStatus(unittest.TestCase):
         response = self.status_collection.search_status(search_status_id)
         # assure status was not found
         self.assertEqual(response, False)
+
+    def test_statuscollect_filter_status_by_words(self):
+        """
+        Test for StatusCollection's filter_status_by_words method
+        """
+        # whole words are found through the text index
+        response = list(self.status_collection.filter_status_by_words("first"))
+        self.assertEqual([status["_id"] for status in response], ["testuser_00001"])
+        # partial words are not, filter_status_by_string is used for those
+        response = list(self.status_collection.filter_status_by_words("fir"))
+        self.assertEqual(response, [])
@@ -93,6 +93,19 @@ class TestUsers(unittest.TestCase):
         # assure nothing was modified
         self.assertEqual(response, False)
 
+    def test_usercollect_bulk_modify(self):
+        """
+        Test for UserCollection's bulk_modify method with a valid and invalid user
+        """
+        # change testuser's email and try to change a user that DNE
+        updates = {"testuser": {"user_email": "testuser@uw.edu"},
+                   "faketestuser": {"user_email": "faketest@user.com"}}
+        response = self.user_collection.bulk_modify(updates)
+        # assure only testuser was matched and modified
+        self.assertEqual(response, {"matched": 1, "modified": 1})
+        self.assertEqual(self.user_collection.search_user("testuser")["user_email"],
+                         "testuser@uw.edu")
+
     def test_usercollect_delete_valid_user(self):
         """
         Test for UserCollection's delete_user method with valid user
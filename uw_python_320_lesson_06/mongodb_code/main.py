@@ -3,12 +3,19 @@ main driver for a simple social network project
 '''
 
 import csv
+from weakref import WeakSet
+
+from pymongo.errors import OperationFailure
 
 import verify_input
 from users import UserCollection
 from user_status import UserStatusCollection
 
 DATABASE = "database.db"
+# mongo error code when a standalone server is asked for a transaction
+ILLEGAL_OPERATION = 20
+# clients connected to standalone servers, which can't run transactions
+standalone_clients = WeakSet()
 
 def init_user_collection(mongo_client, table_name = "UserAccounts"):
     '''
@@ -27,6 +34,7 @@ def init_status_collection(mongo_client, table_name = "StatusUpdates"):
     # pylint: disable=C0103
     db = mongo_client.database
     status_collection = UserStatusCollection(db[table_name])
+    status_collection.ensure_indexes()
     return status_collection
 
 
@@ -185,13 +193,48 @@ def delete_user(user_id, user_collection, status_collection):
     # verify the user_id is valid
     if not verify_input.verify_user_id(user_id)[0]:
         return False
-    # delete user if verified
-    if user_collection.delete_user(user_id):
-        _, all_user_statuses = search_all_status_updates(user_id, status_collection)
-        for status in all_user_statuses:
-            delete_status(status["_id"], status_collection)
-        return True
-    return False
+    # delete user and their statuses if verified
+    return delete_users([user_id], user_collection, status_collection) == 1
+
+
+def delete_users(user_ids, user_collection, status_collection):
+    '''
+    Deletes many users and all of their statuses at once
+
+    The users and their statuses are removed with one delete_many
+    each, in a transaction when the server supports it. Invalid
+    user_ids are skipped. Returns the number of users deleted.
+    '''
+    user_ids = [user_id for user_id in user_ids if verify_input.verify_user_id(user_id)[0]]
+    if not user_ids:
+        return 0
+
+    def delete(session):
+        deleted = user_collection.delete_users(user_ids, session)
+        status_collection.delete_user_statuses(user_ids, session)
+        return deleted
+
+    return run_in_transaction(user_collection.database.database.client, delete)
+
+
+def run_in_transaction(client, operation):
+    '''
+    Calls operation(session) inside a transaction, so its writes
+    are applied together or not at all
+
+    Standalone servers don't support transactions, there operation
+    is called once with no session and the client is remembered so
+    later calls don't ask again.
+    '''
+    if client not in standalone_clients:
+        try:
+            with client.start_session() as session:
+                return session.with_transaction(operation)
+        except OperationFailure as error:
+            if error.code != ILLEGAL_OPERATION:
+                raise
+            standalone_clients.add(client)
+    return operation(None)
 
 
 def search_user(user_id, user_collection):
@@ -289,12 +332,25 @@ def search_status(status_id, status_collection):
     # search for status if verified
     return status_collection.search_status(status_id)
 
-def search_all_status_updates(user_id, status_collection):
+def search_all_status_updates(user_id, status_collection, projection = None,
+                              skip = 0, limit = 0):
     """
     Finds all status updates for a user
+
+    The statuses are fetched lazily each time the results are
+    iterated, and the total is only counted if len() is called.
     """
     # search the status collection for all updates
-    return status_collection.search_all_status_updates(user_id)
+    return status_collection.search_all_status_updates(user_id, projection = projection,
+                                                       skip = skip, limit = limit)
+
+def filter_status_by_words(words, status_collection):
+    """
+    Returns all statuses that contain any of the words, using the
+    status text index
+    """
+    # search the status collection's text index for the words
+    return status_collection.filter_status_by_words(words)
 
 def filter_status_by_string(phrase, status_collection):
     """
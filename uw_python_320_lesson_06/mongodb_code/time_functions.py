@@ -9,6 +9,7 @@ class TimeCode():
         self.db = client.database
         self.user_collection = users.UserCollection(self.db[user_db_name])
         self.status_collection = user_status.UserStatusCollection(self.db[status_db_name])
+        self.status_collection.ensure_indexes()
 
 
     def timeit(method):
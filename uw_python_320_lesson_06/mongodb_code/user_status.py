@@ -4,6 +4,7 @@ classes to manage the user status messages
 # pylint: disable=R0903, E0401
 import logging
 from datetime import datetime
+from pymongo import ASCENDING, TEXT, UpdateOne
 
 # set up logging for user_status file
 log_file_name = "log_" + datetime.now().strftime("%m_%d_%Y")
@@ -17,6 +18,50 @@ formatter = logging.Formatter("""\
 log_file.setFormatter(formatter)
 logger.addHandler(log_file)
 
+# statuses fetched from the server per round trip while iterating
+STATUS_BATCH_SIZE = 100
+
+class StatusResults():
+    '''
+    Lazy results of a status query
+
+    Nothing is sent to the server until the results are iterated or
+    len() is called. Each iteration opens a new cursor that streams
+    the statuses batch_size at a time, so the results can be looped
+    over more than once. len() runs count_documents once and caches
+    it, which is a second query, so callers that stream the statuses
+    should count them as they go instead.
+    '''
+
+    def __init__(self, database, query, projection = None, batch_size = STATUS_BATCH_SIZE,
+                 skip = 0, limit = 0):
+        self.database = database
+        self.query = query
+        self.projection = projection
+        self.batch_size = batch_size
+        self.skip = skip
+        self.limit = limit
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            options = {"skip": self.skip} if self.skip else {}
+            if self.limit:
+                options["limit"] = self.limit
+            self._count = self.database.count_documents(self.query, **options)
+        return self._count
+
+    def __iter__(self):
+        return self.database.find(self.query, self.projection, skip = self.skip,
+                                  limit = self.limit, batch_size = self.batch_size)
+
+    def page(self, skip, limit):
+        '''
+        Returns new lazy results for limit statuses after the first skip
+        '''
+        return StatusResults(self.database, self.query, self.projection,
+                             self.batch_size, skip, limit)
+
 class UserStatusCollection():
     '''
     Collection of UserStatus messages
@@ -26,6 +71,19 @@ class UserStatusCollection():
         self.database = database
         logger.debug("Status database successfully linked")
 
+    def ensure_indexes(self):
+        """
+        Creates the indexes used by status searches if they are missing
+
+        Called once by main.init_status_collection rather than on every
+        instance, so creating a collection object does no I/O.
+        """
+        # search_all_status_updates filters on user_id
+        self.database.create_index([("user_id", ASCENDING)])
+        # filter_status_by_words uses $text search
+        self.database.create_index([("status_text", TEXT)])
+        logger.debug("Status database indexes are in place")
+
     def add_status(self, status_id, user_id, status_text):
         '''
         add a new status message to the collection
@@ -58,19 +116,34 @@ class UserStatusCollection():
         Modifies a status message
 
         The new user_id and status_text are assigned to the existing message
+        with one update_one on _id, the status exists if it matched.
         '''
-        results = self.search_status(status_id)
-        if not results:
+        data = {"user_id": user_id,
+                "status_text": status_text}
+        results = self.database.update_one({"_id": status_id}, {"$set": data})
+        if not results.matched_count:
             # rejects a status that DNE
             logger.debug("Status ID %s DNE in the database", status_id)
             return False
-        data = {"_id": status_id,
-                "user_id": user_id,
-                "status_text": status_text}
-        self.database.update_one(results, {"$set": data})
-        logger.debug("Status ID %s successfully added to the database", status_id)
+        logger.debug("Status ID %s successfully modified in the database", status_id)
         return True
 
+    def bulk_modify(self, updates):
+        '''
+        Modifies many status messages with one bulk_write
+
+        updates maps each status_id to a dict of the fields to change.
+        Returns the number of statuses matched and modified.
+        '''
+        requests = [UpdateOne({"_id": status_id}, {"$set": data})
+                    for status_id, data in updates.items()]
+        if not requests:
+            return {"matched": 0, "modified": 0}
+        results = self.database.bulk_write(requests, ordered = False)
+        logger.debug("%d of %d statuses successfully modified in the database",
+                     results.matched_count, len(requests))
+        return {"matched": results.matched_count, "modified": results.modified_count}
+
 
     def delete_status(self, status_id):
         '''
@@ -84,6 +157,19 @@ class UserStatusCollection():
         logger.debug("Status ID %s successfully added to the database", status_id)
         return True
 
+    def delete_user_statuses(self, user_ids, session = None):
+        '''
+        Deletes every status belonging to the users in user_ids
+        with one delete_many on the user_id index
+
+        Returns the number of statuses deleted.
+        '''
+        results = self.database.delete_many({"user_id": {"$in": list(user_ids)}},
+                                            session = session)
+        logger.debug("%d statuses successfully deleted from the database",
+                     results.deleted_count)
+        return results.deleted_count
+
     def search_status(self, status_id):
         '''
         Find and return a status message by its status_id
@@ -98,14 +184,28 @@ class UserStatusCollection():
         logger.debug("Status ID %s was found in the database", status_id)
         return results
 
-    def search_all_status_updates(self, user_id):
+    def search_all_status_updates(self, user_id, projection = None,
+                                  batch_size = STATUS_BATCH_SIZE, skip = 0, limit = 0):
         """
-        Returns all status updates for a user
+        Returns all status updates for a user as lazy StatusResults
+
+        Only the fields in projection are fetched when it is given,
+        and skip and limit select one page of the statuses.
         """
         query = {"user_id": user_id}
-        len_of_results = self.database.count_documents(query)
+        return StatusResults(self.database, query, projection, batch_size, skip, limit)
+
+    def filter_status_by_words(self, words):
+        """
+        Returns all statuses containing any of the words, using the
+        text index instead of scanning every status
+
+        Words are matched whole and stemmed, use filter_status_by_string
+        to match any substring.
+        """
+        query = {"$text": {"$search": words}}
         results = self.database.find(query)
-        return len_of_results, results
+        return results
 
     def filter_status_by_string(self, phrase):
         """
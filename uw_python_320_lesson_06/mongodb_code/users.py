@@ -4,6 +4,7 @@ Classes for user information for the social network project
 # pylint: disable=R0903, E0401
 import logging
 from datetime import datetime
+from pymongo import UpdateOne
 
 # set up logging for users.py file
 log_file_name = "log_" + datetime.now().strftime("%m_%d_%Y")
@@ -55,19 +56,35 @@ class UserCollection():
     def modify_user(self, user_id, email, user_name, user_last_name):
         '''
         Modifies an existing user
+
+        Sends one update_one on _id, the user exists if it matched.
         '''
-        results = self.search_user(user_id)
-        if not results:
-            logger.debug("User ID %s does not exist in the database", user_id)
-            return False
-        data = {"_id": user_id,
-                "user_email": email,
+        data = {"user_email": email,
                 "user_name": user_name,
                 "user_last_name": user_last_name}
-        self.database.update_one(results, {"$set": data})
+        results = self.database.update_one({"_id": user_id}, {"$set": data})
+        if not results.matched_count:
+            logger.debug("User ID %s does not exist in the database", user_id)
+            return False
         logger.debug("User ID %s successfully modified in the database", user_id)
         return True
 
+    def bulk_modify(self, updates):
+        '''
+        Modifies many existing users with one bulk_write
+
+        updates maps each user_id to a dict of the fields to change.
+        Returns the number of users matched and modified.
+        '''
+        requests = [UpdateOne({"_id": user_id}, {"$set": data})
+                    for user_id, data in updates.items()]
+        if not requests:
+            return {"matched": 0, "modified": 0}
+        results = self.database.bulk_write(requests, ordered = False)
+        logger.debug("%d of %d users successfully modified in the database",
+                     results.matched_count, len(requests))
+        return {"matched": results.matched_count, "modified": results.modified_count}
+
     def delete_user(self, user_id):
         '''
         Deletes an existing user
@@ -79,6 +96,16 @@ class UserCollection():
         logger.debug("User ID %s successfully deleted from the database", user_id)
         return True
 
+    def delete_users(self, user_ids, session = None):
+        '''
+        Deletes every user in user_ids with one delete_many
+
+        Returns the number of users deleted.
+        '''
+        results = self.database.delete_many({"_id": {"$in": list(user_ids)}}, session = session)
+        logger.debug("%d users successfully deleted from the database", results.deleted_count)
+        return results.deleted_count
+
     def search_user(self, user_id):
         '''
         Searches for user data
@@ -0,0 +1,102 @@
+"""
+Chunked bulk inserts that skip rows which can't be added
+"""
+# pylint: disable=E0401, W0212
+import sqlite3
+from functools import lru_cache
+from peewee import IntegrityError, chunked
+
+# sqlite's compiled default for the number of ? in one statement
+DEFAULT_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+# chunks committed together in one transaction
+CHUNKS_PER_TRANSACTION = 10
+
+
+def get_max_variables(database):
+    """
+    Returns how many ? parameters one statement can use on the
+    database's connection
+    """
+    try:
+        return database.connection().getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    # getlimit is new in python 3.11
+    except AttributeError:
+        return DEFAULT_MAX_VARIABLES
+
+
+def get_chunk_size(model, batch_size = None):
+    """
+    Returns the most rows one insert into model can hold, or
+    batch_size if that is smaller
+    """
+    chunk_size = get_max_variables(model._meta.database) // len(model._meta.sorted_fields)
+    return min(batch_size, chunk_size) if batch_size else chunk_size
+
+
+@lru_cache(maxsize = 16)
+def get_insert_sql(model, count):
+    """
+    Returns peewee's INSERT OR IGNORE sql for count rows of model
+
+    peewee takes longer to build the sql of a large insert than
+    sqlite takes to run it, so bulk_insert only caches the statement
+    for its full chunk size, once per model.
+    """
+    row = dict.fromkeys(field.name for field in model._meta.sorted_fields)
+    return model.insert_many([row] * count).on_conflict_ignore().sql()[0]
+
+
+def insert_chunk(model, rows, chunk_size = None):
+    """
+    Inserts rows with one INSERT OR IGNORE, skipping rows whose
+    primary key already exists
+
+    A chunk of chunk_size rows reuses the cached statement, any other
+    size is built by insert_many. A missing column gets its field's
+    default. OR IGNORE does not cover foreign keys or NOT NULL, so if
+    a row fails the chunk is rolled back to its savepoint and split in
+    half until the failing rows are found and skipped. Returns the
+    number of rows inserted.
+    """
+    database = model._meta.database
+    fields = model._meta.sorted_fields
+    rows = [{field.name: row.get(field.name, field.default) for field in fields}
+            for row in rows]
+    try:
+        with database.atomic():
+            if len(rows) == chunk_size:
+                params = [field.db_value(row[field.name]) for row in rows for field in fields]
+                return database.execute_sql(get_insert_sql(model, chunk_size), params).rowcount
+            return model.insert_many(rows).on_conflict_ignore().as_rowcount().execute()
+    except IntegrityError:
+        if len(rows) == 1:
+            return 0
+        middle = len(rows) // 2
+        return insert_chunk(model, rows[:middle]) + insert_chunk(model, rows[middle:])
+
+
+def bulk_insert(model, rows, batch_size = None, chunks_per_transaction = CHUNKS_PER_TRANSACTION):
+    """
+    Inserts rows into model in chunks sized to sqlite's variable
+    limit, committing once every chunks_per_transaction chunks
+
+    rows can be any iterable, it is read one transaction at a time.
+    Returns the number of rows inserted and the number ignored as
+    duplicates or for a missing foreign key, in total and for each
+    transaction under "batches".
+    """
+    database = model._meta.database
+    results = {"inserted": 0, "ignored": 0, "batches": []}
+    chunk_size = get_chunk_size(model, batch_size)
+    chunks = chunked(rows, chunk_size)
+    for transaction_chunks in chunked(chunks, chunks_per_transaction):
+        batch = {"inserted": 0, "ignored": 0}
+        with database.atomic():
+            for chunk in transaction_chunks:
+                inserted = insert_chunk(model, chunk, chunk_size)
+                batch["inserted"] += inserted
+                batch["ignored"] += len(chunk) - inserted
+        results["batches"].append(batch)
+        results["inserted"] += batch["inserted"]
+        results["ignored"] += batch["ignored"]
+    return results
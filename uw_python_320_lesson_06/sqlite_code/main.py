@@ -31,7 +31,7 @@ def init_status_collection():
     return user_status_collection
 
 
-def load_users(filename, user_collection, batch_size = 32):
+def load_users(filename, user_collection, batch_size = None):
     '''
     Opens a CSV file with user data and
     adds it to an existing instance of
@@ -43,7 +43,11 @@ def load_users(filename, user_collection, batch_size = 32):
     next.
     - Returns False if there are any errors
     (such as empty fields in the source CSV file)
-    - Otherwise, it returns True.
+    - Otherwise, it returns the number of users
+    inserted and ignored.
+
+    The rows are inserted in chunks of batch_size, or as many as
+    sqlite allows in one statement if batch_size is None.
     '''
     # verify that the file is a CSV
     if verify_input.verify_csv_file(filename)[0]:
@@ -52,31 +56,19 @@ def load_users(filename, user_collection, batch_size = 32):
             # check that the CSV has the required columns
             if sorted(dict_reader.fieldnames) != sorted(["USER_ID", "EMAIL", "NAME", "LASTNAME"]):
                 return False
-            batch_row = 0
-            batch_data = []
-            for row in dict_reader:
-                if batch_row == batch_size:
-                    # batch load users to database
-                    user_collection.batch_load_users(batch_data)
-                    batch_data = []
-                    batch_row = 0
-                # grab user data on row
-                row_data ={"user_id": row["USER_ID"],
-                           "user_email": row["EMAIL"],
-                           "user_name": row["NAME"],
-                           "user_last_name": row["LASTNAME"]}
-                batch_data.append(row_data)
-                batch_row += 1
-            # load the rest of the batch
-            user_collection.batch_load_users(batch_data)
-        # if everything goes through this file was added successfully
-        return True
+            # grab user data on each row as it is read
+            rows = ({"user_id": row["USER_ID"],
+                     "user_email": row["EMAIL"],
+                     "user_name": row["NAME"],
+                     "user_last_name": row["LASTNAME"]} for row in dict_reader)
+            # bulk load users to database
+            return user_collection.bulk_load_users(rows, batch_size)
     # get error message from verification
     # pylint: disable=W0612
     error_msg = verify_input.verify_csv_file(filename)[1]
     return False
 
-def load_status_updates(filename, status_collection, batch_size = 32):
+def load_status_updates(filename, status_collection, batch_size = None):
     '''
     Opens a CSV file with status data and adds it to an existing
     instance of UserStatusCollection
@@ -84,9 +76,13 @@ def load_status_updates(filename, status_collection, batch_size = 32):
     Requirements:
     - If a status_id already exists, it will ignore it and continue to
       the next.
+    - If a status's user_id does not exist, only that status is ignored.
     - Returns False if there are any errors(such as empty fields in the
       source CSV file)
-    - Otherwise, it returns True.
+    - Otherwise, it returns the number of statuses inserted and ignored.
+
+    The rows are inserted in chunks of batch_size, or as many as
+    sqlite allows in one statement if batch_size is None.
     '''
     # verify that the file is a CSV
     if verify_input.verify_csv_file(filename)[0]:
@@ -95,25 +91,12 @@ def load_status_updates(filename, status_collection, batch_size = 32):
             # check that the CSV has the required columns
             if sorted(dict_reader.fieldnames) != sorted(["STATUS_ID", "USER_ID", "STATUS_TEXT"]):
                 return False
-            batch_row = 0
-            batch_data = []
-            # read in each row in the csv
-            for row in dict_reader:
-                if batch_row == batch_size:
-                    # batch load statuses to database
-                    status_collection.batch_load_statuses(batch_data)
-                    batch_data = []
-                    batch_row = 0
-                # grab status data on row
-                row_data = {"status_id": row["STATUS_ID"],
-                       "user_id": row["USER_ID"],
-                       "status_text": row["STATUS_TEXT"]}
-                batch_data.append(row_data)
-                batch_row += 1
-            # load the rest of the batch
-            status_collection.batch_load_statuses(batch_data)
-        # if everything goes through this file was added successfully
-        return True
+            # grab status data on each row as it is read
+            rows = ({"status_id": row["STATUS_ID"],
+                     "user_id": row["USER_ID"],
+                     "status_text": row["STATUS_TEXT"]} for row in dict_reader)
+            # bulk load statuses to database
+            return status_collection.bulk_load_statuses(rows, batch_size)
     # get error message from verification
     # pylint: disable=W0612
     error_msg = verify_input.verify_csv_file(filename)[1]
@@ -293,3 +276,10 @@ def filter_status_by_string(phrase, status_collection):
     """
     # search the status collection for statuses with the phrase
     return status_collection.filter_status_by_string(phrase)
+
+def search_status_text(query, status_collection, limit = 20):
+    """
+    Returns the statuses that best match a full text query
+    """
+    # search the full text index of status texts
+    return status_collection.search_status_text(query, limit)
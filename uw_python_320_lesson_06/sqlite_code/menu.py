@@ -10,14 +10,24 @@ def load_users():
     Loads user accounts from a file
     '''
     filename = input('Enter filename of user file: ')
-    main.load_users(filename, user_collection, batch_size = 999//4)
+    # chunk sizes follow sqlite's variable limit when no batch_size is given
+    results = main.load_users(filename, user_collection)
+    if results:
+        print(f"{results['inserted']} users were added, {results['ignored']} were ignored")
+    else:
+        print("An error occurred while trying to load users")
 
 def load_status_updates():
     '''
     Loads status updates from a file
     '''
     filename = input('Enter filename for status file: ')
-    main.load_status_updates(filename, status_collection, batch_size = 999//3)
+    # chunk sizes follow sqlite's variable limit when no batch_size is given
+    results = main.load_status_updates(filename, status_collection)
+    if results:
+        print(f"{results['inserted']} statuses were added, {results['ignored']} were ignored")
+    else:
+        print("An error occurred while trying to load status updates")
 
 
 def add_user():
@@ -219,6 +229,18 @@ def flagged_status_updates():
     for status_tuple in [(result.status_id, result.status_text) for result in results]:
         print(status_tuple)
 
+def search_status_text():
+    """
+    Prints the statuses that best match a full text search
+    """
+    query = input('Search words (word* matches a prefix, "a phrase" matches in order): ')
+    results = main.search_status_text(query, status_collection)
+    # print out (status_id, status_text) for the best matches
+    for result in results:
+        print((result.status_id, result.status_text))
+    if not results:
+        print("No statuses matched the search")
+
 def quit_program():
     '''
     Quits program
@@ -243,6 +265,7 @@ if __name__ == '__main__':
         'K': filter_status_by_string,
         'L': flagged_status_updates,
         'M': delete_status,
+        'N': search_status_text,
         'Q': quit_program
     }
     while True:
@@ -260,6 +283,7 @@ if __name__ == '__main__':
                             K: Search all status updates matching a string
                             L: Show all flagged status updates
                             M: Delete status
+                            N: Full text search of status updates
                             Q: Quit
 
                             Please enter your choice: """).upper()
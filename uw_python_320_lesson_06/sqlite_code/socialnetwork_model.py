@@ -2,7 +2,7 @@
 File for establishing the database schema
 """
 # pylint: disable=R0903, E0401
-from peewee import Model, SqliteDatabase, CharField, ForeignKeyField
+from peewee import Model, SqliteDatabase, CharField, ForeignKeyField, OperationalError
 
 db = SqliteDatabase("database.db", pragmas={"foreign_keys": 1})
 db.connect()
@@ -35,5 +35,79 @@ class StatusModel(RootModel):
     status_text = CharField(max_length = 250)
 
 
+# fts5 index of status_text, kept in sync with statusmodel by triggers.
+# It points at statusmodel's implicit rowid, which VACUUM may renumber
+# because the primary key is text, so use vacuum() to run a VACUUM.
+STATUS_SEARCH_TABLE = "statusmodel_fts"
+STATUS_SEARCH_SQL = (
+    f'''CREATE VIRTUAL TABLE "{STATUS_SEARCH_TABLE}" USING fts5(
+        status_text, content = "statusmodel", content_rowid = "rowid")''',
+    f'''CREATE TRIGGER "statusmodel_fts_insert" AFTER INSERT ON "statusmodel" BEGIN
+        INSERT INTO "{STATUS_SEARCH_TABLE}" (rowid, status_text)
+        VALUES (new.rowid, new.status_text);
+    END''',
+    f'''CREATE TRIGGER "statusmodel_fts_delete" AFTER DELETE ON "statusmodel" BEGIN
+        INSERT INTO "{STATUS_SEARCH_TABLE}" ("{STATUS_SEARCH_TABLE}", rowid, status_text)
+        VALUES ('delete', old.rowid, old.status_text);
+    END''',
+    f'''CREATE TRIGGER "statusmodel_fts_update" AFTER UPDATE OF status_text ON "statusmodel"
+    BEGIN
+        INSERT INTO "{STATUS_SEARCH_TABLE}" ("{STATUS_SEARCH_TABLE}", rowid, status_text)
+        VALUES ('delete', old.rowid, old.status_text);
+        INSERT INTO "{STATUS_SEARCH_TABLE}" (rowid, status_text)
+        VALUES (new.rowid, new.status_text);
+    END''',
+    # index the statuses that were added before the index existed
+    f'''INSERT INTO "{STATUS_SEARCH_TABLE}" ("{STATUS_SEARCH_TABLE}") VALUES ('rebuild')''',
+)
+
+
+def has_status_search(database = db):
+    """
+    Checks if the database has the full text index of status texts
+    """
+    return database.table_exists(STATUS_SEARCH_TABLE)
+
+
+def create_status_search(database = db):
+    """
+    Creates the full text index of status texts and the triggers that
+    keep it in sync with StatusModel, if they don't exist yet
+
+    Returns False if sqlite was built without fts5.
+    """
+    if has_status_search(database):
+        return True
+    try:
+        with database.atomic():
+            for sql in STATUS_SEARCH_SQL:
+                database.execute_sql(sql)
+    # no such module: fts5
+    except OperationalError:
+        return False
+    return True
+
+
+def rebuild_status_search(database = db):
+    """
+    Rebuilds the full text index of status texts from StatusModel
+    """
+    database.execute_sql(
+        f'''INSERT INTO "{STATUS_SEARCH_TABLE}" ("{STATUS_SEARCH_TABLE}") VALUES ('rebuild')''')
+
+
+def vacuum(database = db):
+    """
+    Runs VACUUM on the database
+
+    VACUUM may give statusmodel rows new rowids, so the full text
+    index is rebuilt afterwards to point at the right statuses.
+    """
+    database.execute_sql("VACUUM")
+    if has_status_search(database):
+        rebuild_status_search(database)
+
+
 db.create_tables([UserModel, StatusModel])
+create_status_search(db)
 db.close()
@@ -0,0 +1,114 @@
+"""
+Test class to test bulk_load.py
+"""
+# pylint: disable=R0903, E0401
+import unittest
+from peewee import SqliteDatabase
+import bulk_load
+from socialnetwork_model import UserModel, StatusModel
+
+def user_row(user_id):
+    """
+    Returns a user row for user_id
+    """
+    return {"user_id": user_id, "user_email": f"{user_id}@user.com",
+            "user_name": user_id, "user_last_name": "user"}
+
+class TestBulkLoad(unittest.TestCase):
+    """
+    Testing class for bulk_load.py
+    """
+    def setUp(self):
+        """
+        Set up function to create dummy database
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UserModel, StatusModel])
+        self.database.connect()
+        self.database.create_tables([UserModel, StatusModel])
+        UserModel.insert(user_row("testuser")).execute()
+
+    def tearDown(self):
+        """
+        Tear down function to reset database
+        """
+        self.database.drop_tables([UserModel, StatusModel])
+        self.database.close()
+
+    def test_get_insert_sql(self):
+        """
+        Test that get_insert_sql matches the insert peewee would build
+        """
+        rows = [user_row("first"), user_row("second")]
+        self.assertEqual(bulk_load.get_insert_sql(UserModel, 2),
+                         UserModel.insert_many(rows).on_conflict_ignore().sql()[0])
+
+    def test_bulk_insert_duplicates(self):
+        """
+        Test that existing and repeated primary keys are ignored
+        """
+        rows = [user_row("testuser"), user_row("newuser"), user_row("newuser")]
+        results = bulk_load.bulk_insert(UserModel, rows)
+        self.assertEqual(results, {"inserted": 1, "ignored": 2,
+                                   "batches": [{"inserted": 1, "ignored": 2}]})
+        self.assertEqual(UserModel.select().count(), 2)
+
+    def test_bulk_insert_orphans(self):
+        """
+        Test that a missing foreign key only skips its own row
+        """
+        rows = [{"status_id": "testuser_00001", "user_id": "testuser", "status_text": "hi"},
+                {"status_id": "nouser_00001", "user_id": "nouser", "status_text": "hi"},
+                {"status_id": "testuser_00002", "user_id": "testuser", "status_text": "bye"}]
+        results = bulk_load.bulk_insert(StatusModel, rows)
+        self.assertEqual((results["inserted"], results["ignored"]), (2, 1))
+        self.assertEqual([status.status_id for status in StatusModel.select()],
+                         ["testuser_00001", "testuser_00002"])
+
+    def test_bulk_insert_chunk_boundaries(self):
+        """
+        Test that rows split across chunks and transactions are all
+        counted once, with a duplicate on a chunk boundary
+        """
+        rows = [user_row(f"user{number}") for number in range(5)] + [user_row("user4")]
+        results = bulk_load.bulk_insert(UserModel, iter(rows), batch_size = 2,
+                                        chunks_per_transaction = 2)
+        # chunks of 2 rows, committed 2 chunks at a time
+        self.assertEqual(results["batches"], [{"inserted": 4, "ignored": 0},
+                                              {"inserted": 1, "ignored": 1}])
+        self.assertEqual((results["inserted"], results["ignored"]), (5, 1))
+        self.assertEqual(UserModel.select().count(), 6)
+
+    def test_bulk_insert_missing_column(self):
+        """
+        Test that a row missing a column gets the field default, and is
+        skipped when the column is required
+        """
+        rows = [user_row("first"), {"user_id": "second", "user_name": "second"},
+                user_row("third")]
+        results = bulk_load.bulk_insert(UserModel, rows)
+        self.assertEqual((results["inserted"], results["ignored"]), (2, 1))
+        self.assertEqual([user.user_id for user in UserModel.select().order_by(UserModel.user_id)],
+                         ["first", "testuser", "third"])
+
+    def test_bulk_insert_bisects_failures(self):
+        """
+        Test that failing rows spread through a chunk are each skipped
+        and every other row is inserted
+        """
+        rows = [{"status_id": f"status{number:02}",
+                 "user_id": "nouser" if number % 7 == 3 else "testuser",
+                 "status_text": "hi"} for number in range(20)]
+        results = bulk_load.bulk_insert(StatusModel, rows, batch_size = 20)
+        self.assertEqual((results["inserted"], results["ignored"]), (17, 3))
+        self.assertEqual(StatusModel.select().count(), 17)
+
+    def test_get_insert_sql_full_chunks_only(self):
+        """
+        Test that only the full chunk size statement is cached
+        """
+        bulk_load.get_insert_sql.cache_clear()
+        rows = [user_row(f"user{number}") for number in range(5)]
+        bulk_load.bulk_insert(UserModel, rows, batch_size = 2)
+        self.assertEqual(bulk_load.get_insert_sql.cache_info().currsize, 1)
+        self.assertEqual(UserModel.select().count(), 6)
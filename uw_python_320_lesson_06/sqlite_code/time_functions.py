@@ -1,4 +1,5 @@
 import time
+from time import perf_counter
 import main, users, user_status
 from peewee import SqliteDatabase
 from socialnetwork_model import UserModel, StatusModel
@@ -47,7 +48,7 @@ class TimeCode:
         main.load_status_updates(path, self.status_collection)
     @timeit
     def add_status(self, status_id, user_id, status_text):
-        main.add_status(status_id, user_id, status_text, self.status_collection)
+        main.add_status(user_id, status_id, status_text, self.status_collection)
     @timeit
     def update_status(self, status_id, user_id, status_text):
         main.update_status(status_id, user_id, status_text, self.status_collection)
@@ -59,6 +60,31 @@ class TimeCode:
     def search_status(self, status_id):
         main.search_status(status_id, self.status_collection)
 
+    def lookup_latency(self, user_id, status_id, iterations = 10000):
+        """
+        Returns the average microseconds per lookup, before (a get
+        wrapped in a transaction) and after (the search methods, which
+        reuse their compiled sql without one)
+        """
+        def per_lookup(lookup, lookup_id):
+            start = perf_counter()
+            for _ in range(iterations):
+                lookup(lookup_id)
+            return round((perf_counter() - start) * 1000000 / iterations, 2)
+
+        def old_search_user(lookup_id):
+            with self.sqlite_db.transaction():
+                return UserModel.get(UserModel.user_id == lookup_id)
+
+        def old_search_status(lookup_id):
+            with self.sqlite_db.transaction():
+                return StatusModel.get(StatusModel.status_id == lookup_id)
+
+        return {"search_user": (per_lookup(old_search_user, user_id),
+                                per_lookup(self.user_collection.search_user, user_id)),
+                "search_status": (per_lookup(old_search_status, status_id),
+                                  per_lookup(self.status_collection.search_status, status_id))}
+
 
 if __name__ == "__main__":
     time_code = TimeCode("database.db")
@@ -78,6 +104,10 @@ if __name__ == "__main__":
     time_code.add_status(status_id, user_id, status_text)
     time_code.update_status(status_id, user_id, "this is a modified status")
     time_code.search_status(status_id)
+
+    # average lookup latency with and without a transaction per read
+    for lookup, (before, after) in time_code.lookup_latency(user_id, status_id).items():
+        print(f"{lookup}: {before} microseconds before, {after} microseconds after")
     time_code.delete_status(status_id)
 
     # time_code.load_user_csv("./accounts.csv")
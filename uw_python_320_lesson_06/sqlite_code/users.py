@@ -4,7 +4,8 @@ Classes for user information for the social network project
 # pylint: disable=R0903, E0401
 import logging
 from datetime import datetime
-from peewee import IntegrityError, DoesNotExist
+from peewee import IntegrityError
+from bulk_load import bulk_insert
 from socialnetwork_model import UserModel
 
 # set up logging for users.py file
@@ -17,6 +18,10 @@ formatter = logging.Formatter("""%(asctime)s ~ %(filename)s ~ %(message)s""")
 log_file.setFormatter(formatter)
 logger.addHandler(log_file)
 
+# stands in for the key while a lookup's sql is compiled, each search
+# puts its own key in that parameter
+LOOKUP_KEY = "\0lookup_key"
+
 class UserCollection():
     '''
     Contains a collection of Users objects
@@ -24,6 +29,9 @@ class UserCollection():
 
     def __init__(self, database):
         self.database = database
+        # peewee compiles the lookup once here instead of on every search
+        self.search_sql, self.search_params = UserModel.select().where(
+            UserModel.user_id == LOOKUP_KEY).sql()
         logger.debug("User database successfully linked")
 
     def add_user(self, user_id, email, user_name, user_last_name):
@@ -31,18 +39,15 @@ class UserCollection():
         Adds a new user to the collection
         '''
         try:
-            with self.database.transaction():
-                # create a row for the user ID in the database
-                result = UserModel.create(
-                    user_id = user_id,
-                    user_email = email,
-                    user_name = user_name,
-                    user_last_name = user_last_name
-                )
-                # save new row
-                result.save()
-                logger.debug("User ID %s successfully added", user_id)
-                return True
+            # insert a row for the user ID with a single statement
+            UserModel.insert(
+                user_id = user_id,
+                user_email = email,
+                user_name = user_name,
+                user_last_name = user_last_name
+            ).execute()
+            logger.debug("User ID %s successfully added", user_id)
+            return True
         # IntegrityError catches duplicate user_ids
         except IntegrityError:
             logger.debug("User ID %s tried to be added as a duplicate", user_id)
@@ -62,54 +67,63 @@ class UserCollection():
             logger.debug("User batch load did not contain unique IDs")
             return False
 
+    def bulk_load_users(self, rows, batch_size = None):
+        """
+        Adds new users in chunks as large as sqlite allows, skipping
+        users that can't be added instead of rejecting the whole batch
+
+        Returns the number of users inserted and ignored.
+        """
+        results = bulk_insert(UserModel, rows, batch_size)
+        logger.debug("%d users added, %d ignored", results["inserted"], results["ignored"])
+        return results
+
     def modify_user(self, user_id, email, user_name, user_last_name):
         '''
         Modifies an existing user
+
+        One UPDATE statement, the user exists if it changed a row.
         '''
-        with self.database.transaction():
-            # get user ID to modify
-            result = self.search_user(user_id)
-            if result:
-                # modify ID that was fetched
-                result.user_email = email
-                result.user_name = user_name
-                result.user_last_name = user_last_name
-                # save updated row
-                result.save()
-                logger.debug("User ID %s successfully modified", user_id)
-                return True
-            # return False if result is not found
-            logger.debug("User ID %s cannot be modified as it does not exist", user_id)
-            return False
+        rowcount = UserModel.update(
+            user_email = email,
+            user_name = user_name,
+            user_last_name = user_last_name
+        ).where(UserModel.user_id == user_id).execute()
+        if rowcount:
+            logger.debug("User ID %s successfully modified", user_id)
+            return True
+        # return False if no row has the user ID
+        logger.debug("User ID %s cannot be modified as it does not exist", user_id)
+        return False
 
     def delete_user(self, user_id):
         '''
         Deletes an existing user
+
+        One DELETE statement, the user existed if it removed a row.
         '''
-        with self.database.transaction():
-            # get user ID to delete
-            result = self.search_user(user_id)
-            if result:
-                # delete ID that was fetched
-                result.delete_instance()
-                logger.debug("User ID %s successfully deleted", user_id)
-                return True
-            # return False if result is not found
-            logger.debug("User ID %s cannot be deleted as it does not exist", user_id)
-            return False
+        rowcount = UserModel.delete().where(UserModel.user_id == user_id).execute()
+        if rowcount:
+            logger.debug("User ID %s successfully deleted", user_id)
+            return True
+        # return False if no row has the user ID
+        logger.debug("User ID %s cannot be deleted as it does not exist", user_id)
+        return False
 
     def search_user(self, user_id):
         '''
         Searches for user data
+
+        Runs the sql compiled in __init__ with user_id swapped in, which
+        skips peewee building the query on every call. A single read
+        needs no transaction, so it runs in sqlite's implicit one.
         '''
-        try:
-            with self.database.transaction():
-                # get user with user_id
-                result = UserModel.get(UserModel.user_id == user_id)
-                # return row that was feteched
-                logger.debug("User ID %s sucessfully found", user_id)
-                return result
-        # DoesNotExist catches if the user_id does not exist
-        except DoesNotExist:
+        # get user with user_id
+        params = [user_id if param == LOOKUP_KEY else param for param in self.search_params]
+        result = next(iter(UserModel.raw(self.search_sql, *params)), None)
+        if result is None:
             logger.debug("User ID %s cannot be found", user_id)
             return False
+        # return row that was feteched
+        logger.debug("User ID %s sucessfully found", user_id)
+        return result
@@ -0,0 +1,388 @@
+"""
+Benchmark harness for the csv loaders in main.py
+
+Generates seeded user and status csv files, times each loader with
+perf_counter over a grid of batch sizes and worker counts, and writes
+every timing with percentile summaries to a json file.
+
+    python benchmark.py --backend mongomock --users 2000 --statuses 20000
+    python benchmark.py --backend mongod --workers 2 4 8
+    python benchmark.py --summarize benchmark_results.json
+"""
+# pylint: disable=E0401
+import argparse
+import asyncio
+import csv
+import json
+import random
+import statistics
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from itertools import product
+from multiprocessing import cpu_count
+from pathlib import Path
+from time import perf_counter
+import mongomock
+import main
+
+DATABASE_NAME = "benchmark"
+TABLE_NAMES = ("UserAccounts", "StatusUpdates")
+DEFAULT_SEED = 320
+RESULTS_FILE = "benchmark_results.json"
+PERCENTILES = (50, 90, 95, 99)
+
+FIRST_NAMES = ("Larisa", "Danell", "Jean", "William", "Beverly", "Deanna", "Geordi",
+               "Worf", "Data", "Tasha", "Miles", "Keiko", "Reginald", "Ro")
+LAST_NAMES = ("Yesima", "Genie", "Picard", "Riker", "Crusher", "Troi", "LaForge",
+              "Rozhenko", "Soong", "Yar", "OBrien", "Ishikawa", "Barclay", "Laren")
+DOMAINS = ("testmail.com", "goodmail.com", "uw.edu", "starfleet.com")
+STATUS_WORDS = ("code", "is", "finally", "compiling", "sunny", "in", "seattle", "this",
+                "morning", "engage", "shields", "up", "red", "alert", "coffee", "time",
+                "for", "a", "break", "the", "tests", "pass", "again", "weekend")
+
+
+class AsyncMockCollection():
+    """
+    Wraps an in-process mongomock collection with the async
+    collection methods used by the async loaders
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_many(self, documents, ordered = True):
+        return self.collection.insert_many(documents, ordered = ordered)
+
+    async def find(self, *args):
+        for document in self.collection.find(*args):
+            yield document
+
+
+class AsyncMockDatabase():
+    """
+    Wraps an in-process mongomock database
+    """
+    def __init__(self, database):
+        self.database = database
+
+    def __getitem__(self, table_name):
+        return AsyncMockCollection(self.database[table_name])
+
+
+class AsyncMockClient():
+    """
+    In-process stand-in for AsyncMongoClient, sharing the data of
+    client when one is given
+    """
+    def __init__(self, client = None):
+        self.client = client or mongomock.MongoClient()
+        self.closed = False
+
+    def __getitem__(self, database_name):
+        return AsyncMockDatabase(self.client[database_name])
+
+    async def close(self):
+        self.closed = True
+
+
+class MongomockBackend():
+    """
+    Loads into a fresh in-process mongomock client for every run
+
+    Worker processes can't see an in-process client, so the
+    multiprocess loader is not run on this backend.
+    """
+    name = "mongomock"
+    supports_processes = False
+
+    def __init__(self):
+        self.client = None
+
+    def reset(self):
+        """
+        Starts the next run with empty collections
+        """
+        self.client = mongomock.MongoClient()
+
+    def collections(self):
+        """
+        Returns the user and status collections of the current run
+        """
+        return (main.init_user_collection(None, None, DATABASE_NAME, client = self.client),
+                main.init_status_collection(None, None, DATABASE_NAME, client = self.client))
+
+    def loader_options(self):
+        """
+        Returns the connection arguments of the async loaders
+        """
+        return {"database_name": DATABASE_NAME, "client": AsyncMockClient(self.client)}
+
+
+class MongodBackend():
+    """
+    Loads into a mongod server, dropping the collections before every run
+    """
+    name = "mongod"
+    supports_processes = True
+
+    def __init__(self, host = "localhost", port = 27017):
+        self.host = host
+        self.port = port
+
+    def reset(self):
+        """
+        Starts the next run with empty collections
+        """
+        main.nuke_databases(DATABASE_NAME, TABLE_NAMES, self.host, self.port)
+
+    def collections(self):
+        """
+        Returns the user and status collections on the server
+        """
+        return (main.init_user_collection(self.host, self.port, DATABASE_NAME),
+                main.init_status_collection(self.host, self.port, DATABASE_NAME))
+
+    def loader_options(self):
+        """
+        Returns the connection arguments of the multiprocess and async loaders
+        """
+        return {"host": self.host, "port": self.port, "database_name": DATABASE_NAME}
+
+
+BACKENDS = {"mongomock": MongomockBackend, "mongod": MongodBackend}
+
+
+def generate_users(filename, count, seed = DEFAULT_SEED):
+    """
+    Writes count users in the shape of accounts.csv
+
+    The same seed always writes the same file. Returns the user ids.
+    """
+    rng = random.Random(seed)
+    user_ids = []
+    with open(filename, "w", newline = "") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["USER_ID", "EMAIL", "NAME", "LASTNAME"])
+        for number in range(count):
+            name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            user_id = f"{name}.{last_name}{number}"
+            writer.writerow([user_id, f"{user_id}@{rng.choice(DOMAINS)}", name, last_name])
+            user_ids.append(user_id)
+    return user_ids
+
+
+def generate_statuses(filename, user_ids, count, seed = DEFAULT_SEED):
+    """
+    Writes count statuses for random users in the shape of
+    status_updates.csv
+
+    The same seed and user ids always write the same file.
+    """
+    rng = random.Random(seed)
+    status_counts = defaultdict(int)
+    with open(filename, "w", newline = "") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["STATUS_ID", "USER_ID", "STATUS_TEXT"])
+        for _ in range(count):
+            user_id = rng.choice(user_ids)
+            status_counts[user_id] += 1
+            text = " ".join(rng.choices(STATUS_WORDS, k = rng.randint(3, 8))).capitalize()
+            writer.writerow([f"{user_id}_{status_counts[user_id]:05d}", user_id, text])
+
+
+def generate_data(directory, users, statuses, seed = DEFAULT_SEED):
+    """
+    Writes the user and status files into directory and returns their paths
+    """
+    user_file = str(Path(directory) / "accounts.csv")
+    status_file = str(Path(directory) / "status_updates.csv")
+    user_ids = generate_users(user_file, users, seed)
+    generate_statuses(status_file, user_ids, statuses, seed + 1)
+    return user_file, status_file
+
+
+def time_call(function, *args, **kwargs):
+    """
+    Returns the seconds function took to run
+    """
+    start = perf_counter()
+    function(*args, **kwargs)
+    return perf_counter() - start
+
+
+def run_regular(backend, files, batch_size, _workers):
+    """
+    Times the single process loaders, returns the user and status times
+    """
+    user_file, status_file = files
+    user_collection, status_collection = backend.collections()
+    return (time_call(main.load_users, user_file, user_collection, batch_size = batch_size),
+            time_call(main.load_status_updates, status_file, status_collection,
+                      user_collection, batch_size = batch_size))
+
+
+def run_multiprocess(backend, files, batch_size, workers):
+    """
+    Times the worker process loaders, returns the user and status times
+    """
+    user_file, status_file = files
+    options = backend.loader_options()
+    return (time_call(main.load_users_multiprocess, user_file, chunk_size = batch_size,
+                      max_workers = workers, **options),
+            time_call(main.load_status_updates_multiprocess, status_file,
+                      chunk_size = batch_size, max_workers = workers, **options))
+
+
+def run_async(backend, files, batch_size, workers):
+    """
+    Times the asyncio loaders with workers batches in flight, returns
+    the user and status times
+    """
+    user_file, status_file = files
+    options = backend.loader_options()
+    return (time_call(asyncio.run, main.load_users_async(
+                user_file, chunk_size = batch_size, max_in_flight = workers, **options)),
+            time_call(asyncio.run, main.load_status_updates_async(
+                status_file, chunk_size = batch_size, max_in_flight = workers, **options)))
+
+
+LOADERS = {"regular": run_regular, "multiprocess": run_multiprocess, "async": run_async}
+
+
+def build_cases(loaders, batch_sizes, worker_counts):
+    """
+    Returns every loader, batch size and worker count to time
+
+    The regular loader has no workers, so it is only run once per
+    batch size.
+    """
+    cases = []
+    for loader in loaders:
+        counts = (None,) if loader == "regular" else worker_counts
+        for batch_size, workers in product(batch_sizes, counts):
+            cases.append({"loader": loader, "batch_size": batch_size, "workers": workers})
+    return cases
+
+
+def summarize(times):
+    """
+    Returns the count, mean, spread and percentiles of times
+    """
+    if len(times) > 1:
+        cuts = statistics.quantiles(times, n = 100, method = "inclusive")
+    else:
+        cuts = times * 99
+    summary = {"count": len(times),
+               "mean": statistics.fmean(times),
+               "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+               "min": min(times)}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = cuts[percentile - 1]
+    summary["max"] = max(times)
+    return summary
+
+
+def run_benchmark(backend, cases, files, warmup = 1, repeats = 5):
+    """
+    Times every case, after warmup untimed runs, repeats times
+
+    Each run starts from empty collections. Returns one result for
+    the users and one for the statuses of every case.
+    """
+    results = []
+    for case in cases:
+        run = LOADERS[case["loader"]]
+        times = {"users": [], "statuses": []}
+        for iteration in range(warmup + repeats):
+            backend.reset()
+            user_time, status_time = run(backend, files, case["batch_size"], case["workers"])
+            if iteration >= warmup:
+                times["users"].append(user_time)
+                times["statuses"].append(status_time)
+        for stage, stage_times in times.items():
+            results.append({**case, "stage": stage, "times": stage_times,
+                            "summary": summarize(stage_times)})
+        print(f"{case['loader']} batch_size={case['batch_size']} workers={case['workers']}: "
+              f"users p50 {results[-2]['summary']['p50']:.3f}s, "
+              f"statuses p50 {results[-1]['summary']['p50']:.3f}s")
+    return results
+
+
+def print_summary(report):
+    """
+    Prints the summaries of a benchmark report as a table
+    """
+    columns = ["count", "mean", "stdev", "min"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    print(f"backend: {report['config']['backend']}, users: {report['config']['users']}, "
+          f"statuses: {report['config']['statuses']}, seed: {report['config']['seed']}")
+    print(f"{'loader':<13}{'stage':<9}{'batch':>7}{'workers':>8}"
+          + "".join(f"{column:>10}" for column in columns))
+    for result in report["results"]:
+        summary = result["summary"]
+        workers = "-" if result["workers"] is None else result["workers"]
+        print(f"{result['loader']:<13}{result['stage']:<9}{result['batch_size']:>7}"
+              f"{workers:>8}{summary['count']:>10}"
+              + "".join(f"{summary[column]:>10.4f}" for column in columns[1:]))
+
+
+def parse_args(argv = None):
+    """
+    Reads the benchmark settings from the command line
+    """
+    parser = argparse.ArgumentParser(description = "Benchmark the csv loaders in main.py")
+    parser.add_argument("--backend", choices = sorted(BACKENDS), default = "mongomock")
+    parser.add_argument("--host", default = "localhost")
+    parser.add_argument("--port", type = int, default = 27017)
+    parser.add_argument("--loaders", nargs = "+", choices = sorted(LOADERS),
+                        default = list(LOADERS))
+    parser.add_argument("--users", type = int, default = 2000)
+    parser.add_argument("--statuses", type = int, default = 20000)
+    parser.add_argument("--seed", type = int, default = DEFAULT_SEED)
+    parser.add_argument("--batch-sizes", nargs = "+", type = int, default = [128, 1000])
+    parser.add_argument("--workers", nargs = "+", type = int, default = [cpu_count()])
+    parser.add_argument("--warmup", type = int, default = 1)
+    parser.add_argument("--repeats", type = int, default = 5)
+    parser.add_argument("--output", default = RESULTS_FILE)
+    parser.add_argument("--summarize", metavar = "RESULTS",
+                        help = "print the summary of an earlier results file and exit")
+    return parser.parse_args(argv)
+
+
+def main_benchmark(argv = None):
+    """
+    Runs the benchmark described by the command line and writes the report
+    """
+    args = parse_args(argv)
+    if args.summarize:
+        with open(args.summarize) as results_file:
+            print_summary(json.load(results_file))
+        return None
+    if args.backend == "mongod":
+        backend = MongodBackend(args.host, args.port)
+    else:
+        backend = MongomockBackend()
+    loaders = args.loaders
+    if not backend.supports_processes and "multiprocess" in loaders:
+        print(f"Skipping the multiprocess loader, {backend.name} is not shared with "
+              "worker processes")
+        loaders = [loader for loader in loaders if loader != "multiprocess"]
+    cases = build_cases(loaders, args.batch_sizes, args.workers)
+    started = datetime.now().isoformat(timespec = "seconds")
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate_data(directory, args.users, args.statuses, args.seed)
+        results = run_benchmark(backend, cases, files, args.warmup, args.repeats)
+    report = {"config": {"backend": backend.name, "users": args.users,
+                         "statuses": args.statuses, "seed": args.seed,
+                         "warmup": args.warmup, "repeats": args.repeats,
+                         "cpu_count": cpu_count(),
+                         "started": started},
+              "results": results}
+    with open(args.output, "w") as results_file:
+        json.dump(report, results_file, indent = 2)
+    print_summary(report)
+    return report
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -2,33 +2,54 @@
 main driver for a simple social network project
 '''
 
+import asyncio
 import csv
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from multiprocessing import cpu_count
+from weakref import WeakSet
 
-import pandas as pd
-from multiprocessing import Process, cpu_count
-
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
 import verify_input
-from users import UserCollection
+from mongo_clients import get_client
+from users import DUPLICATE_KEY_ERROR, UserCollection, UserIdCache
 from user_status import UserStatusCollection
 
 DATABASE = "database.db"
-
-def init_user_collection(host, port, database_name, table_name = "UserAccounts"):
+LOAD_CHUNK_SIZE = 1000
+USER_COLUMNS = {"USER_ID": "_id",
+                "EMAIL": "user_email",
+                "NAME": "user_name",
+                "LASTNAME": "user_last_name"}
+STATUS_COLUMNS = {"STATUS_ID": "_id",
+                  "USER_ID": "user_id",
+                  "STATUS_TEXT": "status_text"}
+# collections opened by init_load_worker in each worker process
+worker_collections = {}
+# insert_many batches the async loaders keep waiting on at once
+MAX_BATCHES_IN_FLIGHT = 8
+# mongo error code when a standalone server is asked for a transaction
+ILLEGAL_OPERATION = 20
+# clients connected to standalone servers, which can't run transactions
+standalone_clients = WeakSet()
+
+def init_user_collection(host, port, database_name, table_name = "UserAccounts", client = None):
     '''
     Creates and returns a new instance of UserCollection
     '''
     # pylint: disable=C0103
-    user_collection = UserCollection(host, port, database_name, table_name)
+    user_collection = UserCollection(host, port, database_name, table_name, client)
     return user_collection
 
 
-def init_status_collection(host, port, database_name, table_name = "StatusUpdates"):
+def init_status_collection(host, port, database_name, table_name = "StatusUpdates", client = None):
     '''
     Creates and returns a new instance of UserStatusCollection
     '''
     # pylint: disable=C0103
-    status_collection = UserStatusCollection(host, port, database_name, table_name)
+    status_collection = UserStatusCollection(host, port, database_name, table_name, client)
+    status_collection.ensure_indexes()
     return status_collection
 
 
@@ -44,7 +65,8 @@ def load_users(filename, user_collection, batch_size = 32):
     next.
     - Returns False if there are any errors
     (such as empty fields in the source CSV file)
-    - Otherwise, it returns True.
+    - Otherwise, it returns the number of users inserted and
+    skipped as duplicates.
     '''
     # verify that the file is a CSV
     if verify_input.verify_csv_file(filename)[0]:
@@ -53,70 +75,45 @@ def load_users(filename, user_collection, batch_size = 32):
             # check that the CSV has the required columns
             if sorted(dict_reader.fieldnames) != sorted(["USER_ID", "EMAIL", "NAME", "LASTNAME"]):
                 return False
-            batch_row = 0
-            batch_data = []
-            for row in dict_reader:
-                if batch_row == batch_size:
-                    # batch load users to database
-                    user_collection.batch_load_users(batch_data)
-                    batch_data = []
-                    batch_row = 0
-                # grab user data on row
-                row_data ={"_id": row["USER_ID"],
-                           "user_email": row["EMAIL"],
-                           "user_name": row["NAME"],
-                           "user_last_name": row["LASTNAME"]}
-                batch_data.append(row_data)
-                batch_row += 1
-            # load the rest of the batch
-            user_collection.batch_load_users(batch_data)
-        # if everything goes through this file was added successfully
-        return True
+        totals = {"inserted": 0, "duplicates": 0}
+        for batch_data in read_csv_chunks(filename, USER_COLUMNS, batch_size):
+            # batch load users to database
+            results = user_collection.batch_load_users(batch_data)
+            totals["inserted"] += results["inserted"]
+            totals["duplicates"] += len(results["duplicates"])
+        if totals["duplicates"]:
+            print(f"{totals['duplicates']} USERS ALREADY EXISTED")
+        return totals
     # get error message from verification
     # pylint: disable=W0612
     error_msg = verify_input.verify_csv_file(filename)[1]
     return False
 
-def load_users_multiprocess(filename, host = "localhost", port = 27017, database_name = "database"):
+def load_users_multiprocess(filename, host = "localhost", port = 27017, database_name = "database",
+                            chunk_size = LOAD_CHUNK_SIZE, max_workers = None):
     '''
-    Loads the user file with multiprocessing
+    Loads the user file with a pool of worker processes
+
+    Returns a dict with the number of users inserted, skipped as
+    duplicates and orphaned, or False if the file is not valid.
     '''
     # verify that the file is a CSV
-    if verify_input.verify_csv_file(filename)[0]:
-        # optimize batch size
-        file_length = len(pd.read_csv(filename))
-        processors = cpu_count()
-        optimal_batch_size = int(file_length / processors) + 1
-        chunks = pd.read_csv(filename, chunksize = optimal_batch_size, iterator = True)
-        # begin multiprocessing
-        processes = []
-        for _ in range(processors):
-            data = next(chunks)
-            process = Process(target = load_users_multiprocess_worker, args = (data, host, port, database_name,))
-            process.start()
-            processes.append(process)
-        # wait for all processes to finish
-        for process in processes:
-            process.join()
-        return True
-    # get error message if CSV was not valid
-    error_msg = verify_input.verify_csv_file(filename)[1]
-    return False
+    if not verify_input.verify_csv_file(filename)[0]:
+        return False
+    chunks = read_csv_chunks(filename, USER_COLUMNS, chunk_size)
+    return run_load_pipeline(chunks, load_users_chunk, host, port, database_name, max_workers)
 
-def load_users_multiprocess_worker(data, host, port, database_name):
+def load_users_chunk(rows):
     """
-    Helper function for multiprocessing to load users
+    Worker function that loads one chunk of users
     """
-    user_collection = init_user_collection(host, port, database_name)
-    column_map = {"USER_ID": "_id",
-                    "EMAIL": "user_email",
-                    "NAME": "user_name",
-                    "LAST_NAME": "user_last_name"}
-    data.rename(columns = column_map, inplace = True)
-    # adds users in MongoDB format
-    user_collection.batch_load_users(data.to_dict("records"))
+    results = worker_collections["users"].batch_load_users(rows)
+    return {"inserted": results["inserted"],
+            "duplicates": len(results["duplicates"]),
+            "orphaned": 0}
 
-def load_status_updates(filename, status_collection, user_collection, batch_size = 32):
+def load_status_updates(filename, status_collection, user_collection, batch_size = 32,
+                        user_id_cache = None):
     '''
     Opens a CSV file with status data and adds it to an existing
     instance of UserStatusCollection
@@ -124,9 +121,14 @@ def load_status_updates(filename, status_collection, user_collection, batch_size
     Requirements:
     - If a status_id already exists, it will ignore it and continue to
       the next.
+    - If a status's user_id does not exist, only that status is skipped.
     - Returns False if there are any errors(such as empty fields in the
       source CSV file)
-    - Otherwise, it returns True.
+    - Otherwise, it returns the number of statuses inserted, skipped as
+      duplicates and skipped as orphans.
+
+    User ids are checked against user_id_cache, which is built with
+    one query when not given.
     '''
     # verify that the file is a CSV
     if verify_input.verify_csv_file(filename)[0]:
@@ -135,84 +137,224 @@ def load_status_updates(filename, status_collection, user_collection, batch_size
             # check that the CSV has the required columns
             if sorted(dict_reader.fieldnames) != sorted(["STATUS_ID", "USER_ID", "STATUS_TEXT"]):
                 return False
-            batch_row = 0
-            batch_data = []
-            user_ids = set()
-            # read in each row in the csv
-            for row in dict_reader:
-                if batch_row == batch_size:
-                    # batch load statuses to database
-                    matched_users = user_collection.count_users_with_id(list(user_ids))
-                    if matched_users != len(user_ids):
-                        print("STATUSES DID NOT HAVE CORRESPONDING USER ID")
-                    else:
-                        status_collection.batch_load_statuses(batch_data)
-                    batch_data = []
-                    user_ids = set()
-                    batch_row = 0
-                # grab status data on row if the user exists
-                user_id = row["USER_ID"]
-                row_data = {"_id": row["STATUS_ID"],
-                    "user_id": user_id,
-                    "status_text": row["STATUS_TEXT"]}
-                batch_data.append(row_data)
-                user_ids.add(user_id)
-                batch_row += 1
-
-            # load the rest of the batch
-            status_collection.batch_load_statuses(batch_data)
-        # if everything goes through this file was added successfully
-        return True
+        if user_id_cache is None:
+            user_id_cache = UserIdCache(user_collection)
+        totals = {"inserted": 0, "duplicates": 0, "orphaned": 0}
+        for batch_data in read_csv_chunks(filename, STATUS_COLUMNS, batch_size):
+            # only load statuses whose user exists
+            valid_data = [row for row in batch_data if row["user_id"] in user_id_cache]
+            results = status_collection.batch_load_statuses(valid_data)
+            totals["inserted"] += results["inserted"]
+            totals["duplicates"] += len(results["duplicates"])
+            totals["orphaned"] += len(batch_data) - len(valid_data)
+        if totals["orphaned"]:
+            print(f"{totals['orphaned']} STATUSES DID NOT HAVE CORRESPONDING USER ID")
+        return totals
     # get error message from verification
     # pylint: disable=W0612
     error_msg = verify_input.verify_csv_file(filename)[1]
     return False
 
-def load_status_updates_multiprocess(filename, host = "localhost", port = 27017, database_name = "database"):
+def load_status_updates_multiprocess(filename, host = "localhost", port = 27017,
+                                     database_name = "database",
+                                     chunk_size = LOAD_CHUNK_SIZE, max_workers = None):
+    '''
+    Loads the status file with a pool of worker processes
+
+    Returns a dict with the number of statuses inserted, skipped as
+    duplicates and orphaned, or False if the file is not valid.
+    '''
     # verify that the file is a CSV
-    if verify_input.verify_csv_file(filename)[0]:
-        # optimize batch size
-        file_length = len(pd.read_csv(filename))
-        processors = cpu_count()
-        optimal_batch_size = int(file_length / processors) + 1
-        chunks = pd.read_csv(filename, chunksize = optimal_batch_size, iterator = True)
-        # begin multiprocessing
-        processes = []
-        try:
-            for _ in range(processors):
-                data = next(chunks)
-                process = Process(target = load_user_status_multiprocess_worker, args = (data, host, port, database_name,))
-                process.start()
-                processes.append(process)
-        # skip if there is no more chunks left
-        except StopIteration:
-            pass
-        # wait for all processes to finish
-        for process in processes:
-            process.join()
-        return True
-    # get error message if CSV was not valid
-    error_msg = verify_input.verify_csv_file(filename)[1]
-    return False
+    if not verify_input.verify_csv_file(filename)[0]:
+        return False
+    init_status_collection(host, port, database_name)
+    # the user_ids are read once here and handed to every worker
+    user_id_cache = UserIdCache(init_user_collection(host, port, database_name))
+    chunks = read_csv_chunks(filename, STATUS_COLUMNS, chunk_size)
+    return run_load_pipeline(chunks, load_statuses_chunk, host, port, database_name, max_workers,
+                             user_ids = user_id_cache.user_ids)
+
+def load_statuses_chunk(rows):
+    """
+    Worker function that loads one chunk of statuses
+
+    Statuses whose user does not exist are skipped as orphans.
+    """
+    user_ids = worker_collections["user_ids"]
+    valid_rows = [row for row in rows if row["user_id"] in user_ids]
+    results = worker_collections["statuses"].batch_load_statuses(valid_rows)
+    return {"inserted": results["inserted"],
+            "duplicates": len(results["duplicates"]),
+            "orphaned": len(rows) - len(valid_rows)}
+
+def read_csv_chunks(filename, column_map, chunk_size = LOAD_CHUNK_SIZE):
+    """
+    Reads a CSV file once and yields lists of up to chunk_size rows,
+    with the columns renamed to their MongoDB fields
+    """
+    with open(filename, "r", encoding = "utf-8") as csv_file:
+        dict_reader = csv.DictReader(csv_file, delimiter = ",")
+        while True:
+            chunk = [{field: row[column] for column, field in column_map.items()}
+                     for row in islice(dict_reader, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+def init_load_worker(host, port, database_name, user_ids = None):
+    """
+    Runs once in each worker process to open the single MongoClient
+    that all of that worker's chunks are loaded through
+
+    user_ids is the set of existing users built by the parent, only
+    the status pipeline needs it.
+    """
+    client = get_client(host, port)
+    worker_collections["users"] = init_user_collection(host, port, database_name,
+                                                       client = client)
+    # the parent created the status indexes, so the workers skip them
+    worker_collections["statuses"] = UserStatusCollection(host, port, database_name,
+                                                          "StatusUpdates", client)
+    worker_collections["user_ids"] = user_ids
+
+def run_load_pipeline(chunks, load_chunk, host, port, database_name, max_workers = None,
+                      user_ids = None):
+    """
+    Sends chunks to a pool of worker processes and adds up the
+    inserted, duplicate and orphaned counts they return
+
+    user_ids is passed on to init_load_worker in every worker.
+
+    At most two chunks per worker are read ahead of the workers, so
+    a large file is never held in memory all at once.
+    """
+    max_workers = max_workers or cpu_count()
+    totals = {"inserted": 0, "duplicates": 0, "orphaned": 0}
+    def add_to_totals(futures):
+        for future in futures:
+            for key, count in future.result().items():
+                totals[key] += count
+    with ProcessPoolExecutor(max_workers = max_workers, initializer = init_load_worker,
+                             initargs = (host, port, database_name, user_ids)) as executor:
+        in_flight = set()
+        for chunk in chunks:
+            in_flight.add(executor.submit(load_chunk, chunk))
+            # wait before reading the next chunk once the pool is full
+            if len(in_flight) >= max_workers * 2:
+                done, in_flight = wait(in_flight, return_when = FIRST_COMPLETED)
+                add_to_totals(done)
+        add_to_totals(wait(in_flight).done)
+    return totals
+
+async def insert_many_async(collection, rows):
+    """
+    Inserts a chunk with one unordered insert_many on an async
+    collection, skipping rows whose _id already exists
+    """
+    if not rows:
+        return {"inserted": 0, "duplicates": 0}
+    try:
+        results = await collection.insert_many(rows, ordered = False)
+        return {"inserted": len(results.inserted_ids), "duplicates": 0}
+    except BulkWriteError as error:
+        write_errors = error.details["writeErrors"]
+        if any(write_error["code"] != DUPLICATE_KEY_ERROR for write_error in write_errors):
+            raise
+        return {"inserted": error.details["nInserted"], "duplicates": len(write_errors)}
+
+async def load_users_chunk_async(rows, user_table):
+    """
+    Loads one chunk of users on an async collection
+    """
+    results = await insert_many_async(user_table, rows)
+    return {**results, "orphaned": 0}
+
+async def load_statuses_chunk_async(rows, user_table, status_table):
+    """
+    Loads one chunk of statuses on an async collection, skipping
+    statuses whose user does not exist
+    """
+    query = {"_id": {"$in": list({row["user_id"] for row in rows})}}
+    existing_user_ids = {user["_id"] async for user in user_table.find(query, {"_id": 1})}
+    valid_rows = [row for row in rows if row["user_id"] in existing_user_ids]
+    results = await insert_many_async(status_table, valid_rows)
+    return {**results, "orphaned": len(rows) - len(valid_rows)}
 
-def load_user_status_multiprocess_worker(data, host, port, database_name):
+async def run_async_load(chunks, load_chunk, max_in_flight = MAX_BATCHES_IN_FLIGHT):
     """
-    Helper function for multiprocessing to load users
+    Runs load_chunk on every chunk with at most max_in_flight
+    batches waiting on the database at once, and adds up the
+    inserted, duplicate and orphaned counts
     """
-    user_collection = init_user_collection(host, port, database_name)
-    status_collection = init_status_collection(host, port, database_name)
-    column_map = {"STATUS_ID": "_id",
-                    "USER_ID": "user_id",
-                    "STATUS_TEXT": "status_text"}
-    data.rename(columns = column_map, inplace = True)
-    # check that the user_id exists for each status
-    ids = data["user_id"].unique().tolist()
-    matched_users = user_collection.count_users_with_id(ids)
-    if matched_users != len(ids):
-        print("STATUSES DID NOT HAVE CORRESPONDING USER ID")
+    totals = {"inserted": 0, "duplicates": 0, "orphaned": 0}
+    def add_to_totals(tasks):
+        for task in tasks:
+            for key, count in task.result().items():
+                totals[key] += count
+    in_flight = set()
+    for chunk in chunks:
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = await asyncio.wait(in_flight,
+                                                 return_when = asyncio.FIRST_COMPLETED)
+            add_to_totals(done)
+        in_flight.add(asyncio.create_task(load_chunk(chunk)))
+    if in_flight:
+        done, _ = await asyncio.wait(in_flight)
+        add_to_totals(done)
+    return totals
+
+async def load_users_async(filename, host = "localhost", port = 27017, database_name = "database",
+                           chunk_size = LOAD_CHUNK_SIZE, max_in_flight = MAX_BATCHES_IN_FLIGHT,
+                           client = None):
+    '''
+    Loads the user file with asyncio over one async MongoClient
+
+    A client can be passed in, for example a mock for testing, and
+    is left open. A client opened here is closed before returning.
+    Returns a dict with the number of users inserted, skipped as
+    duplicates and orphaned, or False if the file is not valid.
+    '''
+    if not verify_input.verify_csv_file(filename)[0]:
+        return False
+    own_client = client is None
+    if own_client:
+        client = AsyncMongoClient(host = host, port = port)
+    try:
+        user_table = client[database_name]["UserAccounts"]
+        chunks = read_csv_chunks(filename, USER_COLUMNS, chunk_size)
+        return await run_async_load(chunks,
+                                    lambda rows: load_users_chunk_async(rows, user_table),
+                                    max_in_flight)
+    finally:
+        if own_client:
+            await client.close()
+
+async def load_status_updates_async(filename, host = "localhost", port = 27017,
+                                    database_name = "database", chunk_size = LOAD_CHUNK_SIZE,
+                                    max_in_flight = MAX_BATCHES_IN_FLIGHT, client = None):
+    '''
+    Loads the status file with asyncio over one async MongoClient
+
+    A client can be passed in, for example a mock for testing, and
+    is left open. A client opened here is closed before returning.
+    Returns a dict with the number of statuses inserted, skipped as
+    duplicates and orphaned, or False if the file is not valid.
+    '''
+    if not verify_input.verify_csv_file(filename)[0]:
         return False
-    # adds users in MongoDB format
-    return status_collection.batch_load_statuses(data.to_dict("records"))
+    own_client = client is None
+    if own_client:
+        client = AsyncMongoClient(host = host, port = port)
+    try:
+        user_table = client[database_name]["UserAccounts"]
+        status_table = client[database_name]["StatusUpdates"]
+        chunks = read_csv_chunks(filename, STATUS_COLUMNS, chunk_size)
+        return await run_async_load(
+            chunks, lambda rows: load_statuses_chunk_async(rows, user_table, status_table),
+            max_in_flight)
+    finally:
+        if own_client:
+            await client.close()
 
 def add_user(user_id, email, user_name, user_last_name, user_collection):
     '''
@@ -280,13 +422,48 @@ def delete_user(user_id, user_collection, status_collection):
     # verify the user_id is valid
     if not verify_input.verify_user_id(user_id)[0]:
         return False
-    # delete user if verified
-    if user_collection.delete_user(user_id):
-        _, all_user_statuses = search_all_status_updates(user_id, status_collection)
-        for status in all_user_statuses:
-            delete_status(status["_id"], status_collection)
-        return True
-    return False
+    # delete user and their statuses if verified
+    return delete_users([user_id], user_collection, status_collection) == 1
+
+
+def delete_users(user_ids, user_collection, status_collection):
+    '''
+    Deletes many users and all of their statuses at once
+
+    The users and their statuses are removed with one delete_many
+    each, in a transaction when the server supports it. Invalid
+    user_ids are skipped. Returns the number of users deleted.
+    '''
+    user_ids = [user_id for user_id in user_ids if verify_input.verify_user_id(user_id)[0]]
+    if not user_ids:
+        return 0
+
+    def delete(session):
+        deleted = user_collection.delete_users(user_ids, session)
+        status_collection.delete_user_statuses(user_ids, session)
+        return deleted
+
+    return run_in_transaction(user_collection.database.database.client, delete)
+
+
+def run_in_transaction(client, operation):
+    '''
+    Calls operation(session) inside a transaction, so its writes
+    are applied together or not at all
+
+    Standalone servers don't support transactions, there operation
+    is called once with no session and the client is remembered so
+    later calls don't ask again.
+    '''
+    if client not in standalone_clients:
+        try:
+            with client.start_session() as session:
+                return session.with_transaction(operation)
+        except OperationFailure as error:
+            if error.code != ILLEGAL_OPERATION:
+                raise
+            standalone_clients.add(client)
+    return operation(None)
 
 
 def search_user(user_id, user_collection):
@@ -384,12 +561,25 @@ def search_status(status_id, status_collection):
     # search for status if verified
     return status_collection.search_status(status_id)
 
-def search_all_status_updates(user_id, status_collection):
+def search_all_status_updates(user_id, status_collection, projection = None,
+                              skip = 0, limit = 0):
     """
     Finds all status updates for a user
+
+    The statuses are fetched lazily each time the results are
+    iterated, and the total is only counted if len() is called.
     """
     # search the status collection for all updates
-    return status_collection.search_all_status_updates(user_id)
+    return status_collection.search_all_status_updates(user_id, projection = projection,
+                                                       skip = skip, limit = limit)
+
+def filter_status_by_words(words, status_collection):
+    """
+    Returns all statuses that contain any of the words, using the
+    status text index
+    """
+    # search the status collection's text index for the words
+    return status_collection.filter_status_by_words(words)
 
 def filter_status_by_string(phrase, status_collection):
     """
@@ -399,7 +589,7 @@ def filter_status_by_string(phrase, status_collection):
     return status_collection.filter_status_by_string(phrase)
 
 def nuke_databases(database_name, table_names, host = "localhost", port = 27017):
-    client = MongoClient(host = host, port = port)
+    client = get_client(host, port)
     for table_name in table_names:
         client[database_name][table_name].drop()
     return True
@@ -2,8 +2,8 @@
 Provides a basic frontend
 '''
 import sys
-from pymongo import MongoClient
 import main
+from mongo_clients import close_all
 from verify_input import verify_yes_or_no
 
 def load_users():
@@ -139,33 +139,41 @@ def search_all_status_updates():
     Finds all statuses for a given user
     """
     user_id = input("User ID: ")
-    result_len, results = main.search_all_status_updates(user_id, status_collection)
-    if results:
-        # determine is the sentence needs plural forms or not
-        plural_status = "" if result_len == 1 else "es"
-        was_or_were = "was" if result_len == 1 else "were"
-        # print how many results were found for the user
-        print(f"A total of {result_len} status{plural_status} {was_or_were} found for {user_id}")
+    # only the status text is shown, so only it is fetched
+    results = main.search_all_status_updates(user_id, status_collection,
+                                             projection = ["status_text"])
+    # the statuses are fetched as they are shown and counted as they go,
+    # so there is no separate count query
+    statuses = iter(results)
+    status = next(statuses, None)
+    if status is not None:
+        shown = 0
         user_response = input("Would you like to see the next status update? (Y/N): ").lower()
         # loop while user is not entering the right response
         while not verify_yes_or_no(user_response):
             user_response = input("Please enter a valid choice (Y/N): ").lower()
         # loop while the user wants to see more statuses
         while user_response == "y":
-            try:
-                # print next status and ask if they want to see the next
-                print(next(results)["status_text"])
-                user_response = input("Would you like to see the next status update? (Y/N): "
-                                      ).lower()
-                # loop while user is not entering thne right response
-                while not verify_yes_or_no(user_response):
-                    user_response = input("Please enter a valid choice (Y/N): ").lower()
-            # this error means we have reached the final status
-            except StopIteration:
+            # print next status and ask if they want to see the next
+            print(status["status_text"])
+            shown += 1
+            status = next(statuses, None)
+            # stop once the final status has been shown
+            if status is None:
                 print("INFO: You have reached the last status update")
-                user_response = "n"
+                break
+            user_response = input("Would you like to see the next status update? (Y/N): "
+                                  ).lower()
+            # loop while user is not entering thne right response
+            while not verify_yes_or_no(user_response):
+                user_response = input("Please enter a valid choice (Y/N): ").lower()
+        # determine is the sentence needs plural forms or not
+        plural_status = "" if shown == 1 else "es"
+        was_or_were = "was" if shown == 1 else "were"
+        # print how many statuses were shown for the user
+        print(f"{shown} status{plural_status} {was_or_were} shown for {user_id}")
     else:
-        print("An error occurred while searching for that user")
+        print(f"No status updates were found for {user_id}")
 
 def filter_status_by_string():
     """
@@ -234,6 +242,7 @@ def quit_program():
     '''
     Quits program
     '''
+    close_all()
     sys.exit()
 
 
@@ -242,7 +251,7 @@ if __name__ == '__main__':
     port = 27017
     database_name = "database"
     user_collection = main.init_user_collection(host, port, database_name)
-    status_collection = main.init_status_collection(host, port)
+    status_collection = main.init_status_collection(host, port, database_name)
     menu_options = {
         'A': load_users,
         'B': load_status_updates,
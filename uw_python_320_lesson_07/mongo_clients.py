@@ -0,0 +1,57 @@
+"""
+Process-wide registry of shared MongoClients
+"""
+# pylint: disable=E0401
+import os
+from threading import Lock
+from pymongo import MongoClient
+
+# largest number of connections each client keeps to its server
+MAX_POOL_SIZE = 100
+
+_clients = {}
+_lock = Lock()
+
+
+def get_client(host, port, max_pool_size = None):
+    """
+    Returns the MongoClient for (host, port), creating it the first
+    time it is asked for so every collection in this process shares
+    one connection pool
+
+    max_pool_size only applies when the client is created.
+    """
+    key = (host, port)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(host = host, port = port,
+                                 maxPoolSize = max_pool_size or MAX_POOL_SIZE)
+            _clients[key] = client
+        return client
+
+
+def close_all():
+    """
+    Closes every client in the registry
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def _forget_clients():
+    """
+    Drops clients inherited from the parent after a fork
+
+    MongoClients are not fork-safe, so a child process opens its
+    own. They are not closed because the sockets belong to the parent.
+    """
+    global _lock  # pylint: disable=W0603
+    _clients.clear()
+    _lock = Lock()
+
+
+os.register_at_fork(after_in_child = _forget_clients)
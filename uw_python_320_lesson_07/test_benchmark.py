@@ -0,0 +1,51 @@
+import json
+import benchmark
+
+
+def test_generated_data_is_seeded(tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    first = benchmark.generate_data(tmp_path / "first", 20, 100, seed = 7)
+    second = benchmark.generate_data(tmp_path / "second", 20, 100, seed = 7)
+    for first_file, second_file in zip(first, second):
+        with open(first_file) as first_csv, open(second_file) as second_csv:
+            assert first_csv.read() == second_csv.read()
+    with open(first[1]) as status_csv:
+        assert status_csv.readline().strip() == "STATUS_ID,USER_ID,STATUS_TEXT"
+        assert len(status_csv.readlines()) == 100
+
+def test_build_cases():
+    cases = benchmark.build_cases(["regular", "async"], [10, 100], [1, 4])
+    assert cases[:2] == [{"loader": "regular", "batch_size": 10, "workers": None},
+                         {"loader": "regular", "batch_size": 100, "workers": None}]
+    assert len(cases) == 6
+
+def test_summarize():
+    summary = benchmark.summarize([float(time) for time in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["min"] == 1.0 and summary["max"] == 100.0
+    assert summary["p50"] == 50.5
+    assert summary["p99"] == 99.01
+    assert benchmark.summarize([2.0])["p95"] == 2.0
+
+def test_mongomock_benchmark_loads_everything(tmp_path):
+    files = benchmark.generate_data(tmp_path, 30, 200)
+    backend = benchmark.MongomockBackend()
+    cases = benchmark.build_cases(["regular", "async"], [16], [2])
+    results = benchmark.run_benchmark(backend, cases, files, warmup = 1, repeats = 2)
+    assert [(result["loader"], result["stage"]) for result in results] == [
+        ("regular", "users"), ("regular", "statuses"), ("async", "users"), ("async", "statuses")]
+    assert all(len(result["times"]) == 2 for result in results)
+    user_collection, status_collection = backend.collections()
+    assert user_collection.database.count_documents({}) == 30
+    assert status_collection.database.count_documents({}) == 200
+
+def test_main_benchmark_writes_report(tmp_path, capsys):
+    output = tmp_path / "results.json"
+    benchmark.main_benchmark(["--users", "10", "--statuses", "50", "--repeats", "1",
+                              "--warmup", "0", "--batch-sizes", "8", "--workers", "2",
+                              "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["config"]["backend"] == "mongomock"
+    assert {result["loader"] for result in report["results"]} == {"regular", "async"}
+    assert "Skipping the multiprocess loader" in capsys.readouterr().out
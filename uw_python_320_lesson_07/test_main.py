@@ -1,9 +1,14 @@
 # docker run --name mongodb -p 27017:27017 -p 27018:27017 -d mongo:latest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from unittest.mock import patch
+import asyncio
+import time
+import mongomock
 import main
 import menu
-import time
-import csv
+from benchmark import AsyncMockClient
+
 
 def test_user_multiprocess_load():
     file = "accounts.csv"
@@ -15,6 +20,104 @@ def test_status_multiprocess_load():
     with patch("builtins.input", return_value = mock_file):
         menu.load_status_updates_multiprocess()
 
+def test_user_async_load():
+    file = "accounts.csv"
+    asyncio.run(main.load_users_async(file))
+
+def test_status_async_load():
+    file = "status_updates.csv"
+    asyncio.run(main.load_status_updates_async(file))
+
+def test_async_load_with_mock(tmp_path):
+    user_file = tmp_path / "accounts.csv"
+    user_file.write_text("USER_ID,NAME,LASTNAME,EMAIL\n"
+                         "jlpicard,Jean,Picard,jlpicard@starfleet.com\n"
+                         "wriker,William,Riker,wriker@starfleet.com\n"
+                         "jlpicard,Jean,Picard,jlpicard@starfleet.com\n")
+    status_file = tmp_path / "status_updates.csv"
+    status_file.write_text("STATUS_ID,USER_ID,STATUS_TEXT\n"
+                           "jlpicard001,jlpicard,Engage\n"
+                           "rando001,rando,Who am I\n"
+                           "wriker001,wriker,Red alert\n")
+    client = AsyncMockClient()
+    user_results = asyncio.run(main.load_users_async(str(user_file), chunk_size = 1,
+                                                     client = client))
+    status_results = asyncio.run(main.load_status_updates_async(str(status_file),
+                                                                chunk_size = 2,
+                                                                client = client))
+    assert user_results == {"inserted": 2, "duplicates": 1, "orphaned": 0}
+    assert status_results == {"inserted": 2, "duplicates": 0, "orphaned": 1}
+    # a client passed in is left open
+    assert not client.closed
+
+def test_async_load_closes_own_client(tmp_path):
+    user_file = tmp_path / "accounts.csv"
+    user_file.write_text("USER_ID,NAME,LASTNAME,EMAIL\n"
+                         "jlpicard,Jean,Picard,jlpicard@starfleet.com\n")
+    client = AsyncMockClient()
+    with patch("main.AsyncMongoClient", return_value = client):
+        asyncio.run(main.load_users_async(str(user_file)))
+    assert client.closed
+
+def test_user_load_with_mock(tmp_path):
+    user_file = tmp_path / "accounts.csv"
+    user_file.write_text("USER_ID,NAME,LASTNAME,EMAIL\n"
+                         "jlpicard,Jean,Picard,jlpicard@starfleet.com\n"
+                         "wriker,William,Riker,wriker@starfleet.com\n"
+                         "jlpicard,Jean,Picard,jlpicard@starfleet.com\n")
+    user_collection = main.init_user_collection(None, None, "database",
+                                                client = mongomock.MongoClient())
+    results = main.load_users(str(user_file), user_collection, batch_size = 2)
+    assert results == {"inserted": 2, "duplicates": 1}
+
+def test_init_status_collection_creates_indexes():
+    status_collection = main.init_status_collection(None, None, "database",
+                                                    client = mongomock.MongoClient())
+    indexes = status_collection.database.index_information()
+    assert [("user_id", 1)] in [index["key"] for index in indexes.values()]
+    assert any(index["key"][0][1] == "text" for index in indexes.values())
+
+def test_status_load_orphans_with_mock(tmp_path):
+    status_file = tmp_path / "status_updates.csv"
+    status_file.write_text("STATUS_ID,USER_ID,STATUS_TEXT\n"
+                           "jlpicard001,jlpicard,Engage\n"
+                           "rando001,rando,Who am I\n"
+                           "jlpicard001,jlpicard,Engage\n"
+                           "rando002,rando,Still me\n")
+    client = mongomock.MongoClient()
+    user_collection = main.init_user_collection(None, None, "database", client = client)
+    user_collection.add_user("jlpicard", "jlpicard@starfleet.com", "Jean", "Picard")
+    status_collection = main.init_status_collection(None, None, "database", client = client)
+    results = main.load_status_updates(str(status_file), status_collection, user_collection,
+                                       batch_size = 2)
+    assert results == {"inserted": 1, "duplicates": 1, "orphaned": 2}
+
+def test_load_statuses_chunk_orphans():
+    client = mongomock.MongoClient()
+    rows = [{"_id": "jlpicard001", "user_id": "jlpicard", "status_text": "Engage"},
+            {"_id": "rando001", "user_id": "rando", "status_text": "Who am I"}]
+    # the worker state is put back after the test
+    with patch.dict(main.worker_collections), patch("main.get_client", return_value = client):
+        main.init_load_worker(None, None, "database", user_ids = {"jlpicard"})
+        assert main.load_statuses_chunk(rows) == {"inserted": 1, "duplicates": 0, "orphaned": 1}
+        assert main.load_statuses_chunk(rows) == {"inserted": 0, "duplicates": 1, "orphaned": 1}
+    assert [status["_id"] for status in client["database"]["StatusUpdates"].find()] == \
+        ["jlpicard001"]
+
+def test_menu_search_all_status_updates_streams(capsys):
+    status_collection = main.init_status_collection(None, None, "database",
+                                                    client = mongomock.MongoClient())
+    status_collection.add_status("jlpicard001", "jlpicard", "Engage")
+    status_collection.add_status("jlpicard002", "jlpicard", "Make it so")
+    with patch("menu.status_collection", status_collection, create = True), \
+         patch("builtins.input", side_effect = ["jlpicard", "y", "y"]), \
+         patch.object(status_collection.database, "count_documents") as count_documents:
+        menu.search_all_status_updates()
+    count_documents.assert_not_called()
+    assert capsys.readouterr().out.splitlines() == [
+        "Engage", "Make it so", "INFO: You have reached the last status update",
+        "2 statuses were shown for jlpicard"]
+
 def test_user_load():
     file = "accounts.csv"
     user_collection = main.init_user_collection("localhost", 27017, "database")
@@ -26,41 +129,47 @@ def test_status_load():
     status_collection = main.init_status_collection("localhost", 27017, "database")
     main.load_status_updates(file, status_collection, user_collection, batch_size = 128)
 
-if __name__ == "__main__":
-    db = "database"
-    tables = ["UserAccounts", "StatusUpdates"]
-    iterations = 10
-    # wipe initial databases
-    main.nuke_databases(db, tables)
-    # set up functions to test
-    test_functions = {"mp":{"user": test_user_multiprocess_load,
-                      "status": test_status_multiprocess_load},
-                      "regular": {"user": test_user_load,
-                      "status": test_status_load}}
-    # test functions
-    for iteration in range(iterations):
-        for key, functions in test_functions.items():
-            # tests the user function
-            user_fun = functions["user"]
-            status_fun = functions["status"]
-            start_time = time.time()
-            user_fun()
-            end_time = time.time()
-            delta_user = end_time - start_time
-            # tests the status function
-            start_time = time.time()
-            status_fun()
-            end_time = time.time()
-            delta_status = end_time - start_time
-            # clears databases for the next test
-            main.nuke_databases(db, tables)
-            # write data to a csv file with times
-            with open("results.csv", "a", newline = "") as csvfile:
-                field_names = ["function", "iteration", "time"]
-                writer = csv.DictWriter(csvfile, fieldnames = field_names, delimiter = ",")
-                writer.writerow({"function": f"{key}_user",
-                                "iteration": iteration,
-                                "time": delta_user})
-                writer.writerow({"function": f"{key}_status",
-                                "iteration": iteration,
-                                "time": delta_status})
\ No newline at end of file
+def test_read_csv_chunks_last_chunk(tmp_path):
+    user_file = tmp_path / "accounts.csv"
+    user_file.write_text("USER_ID,NAME,LASTNAME,EMAIL\n" +
+                         "".join(f"user{number},User,Number,user{number}@user.com\n"
+                                 for number in range(5)))
+    chunks = list(main.read_csv_chunks(str(user_file), main.USER_COLUMNS, chunk_size = 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[2] == [{"_id": "user4", "user_email": "user4@user.com",
+                          "user_name": "User", "user_last_name": "Number"}]
+    # a full last chunk is not followed by an empty one
+    chunks = list(main.read_csv_chunks(str(user_file), main.USER_COLUMNS, chunk_size = 5))
+    assert [len(chunk) for chunk in chunks] == [5]
+
+def test_read_csv_chunks_empty_file(tmp_path):
+    user_file = tmp_path / "accounts.csv"
+    user_file.write_text("")
+    assert not list(main.read_csv_chunks(str(user_file), main.USER_COLUMNS))
+    user_file.write_text("USER_ID,NAME,LASTNAME,EMAIL\n")
+    assert not list(main.read_csv_chunks(str(user_file), main.USER_COLUMNS))
+
+def test_run_load_pipeline_read_ahead():
+    max_workers = 2
+    lock = Lock()
+    counts = {"read": 0, "loaded": 0, "read_ahead": 0}
+    def chunks():
+        for number in range(20):
+            with lock:
+                counts["read"] += 1
+                counts["read_ahead"] = max(counts["read_ahead"],
+                                           counts["read"] - counts["loaded"])
+            yield [number] * 3
+    def load_chunk(rows):
+        time.sleep(0.01)
+        with lock:
+            counts["loaded"] += 1
+        return {"inserted": 2, "duplicates": 1, "orphaned": len(rows) - 3}
+    # threads share the counters, the pool only needs the executor interface
+    with patch("main.ProcessPoolExecutor", ThreadPoolExecutor), \
+         patch("main.init_load_worker"):
+        totals = main.run_load_pipeline(chunks(), load_chunk, None, None, "database",
+                                        max_workers = max_workers)
+    assert totals == {"inserted": 40, "duplicates": 20, "orphaned": 0}
+    assert counts["loaded"] == 20
+    assert counts["read_ahead"] <= max_workers * 2
@@ -0,0 +1,34 @@
+from unittest.mock import patch
+import mongomock
+import pytest
+import mongo_clients
+
+
+@pytest.fixture(autouse = True)
+def mock_mongo_client():
+    with patch("mongo_clients.MongoClient", mongomock.MongoClient):
+        yield
+    mongo_clients.close_all()
+
+def test_get_client_same_key():
+    client = mongo_clients.get_client("localhost", 27017)
+    assert mongo_clients.get_client("localhost", 27017) is client
+    assert mongo_clients.get_client("localhost", 27018) is not client
+    assert len(mongo_clients._clients) == 2
+
+def test_close_all():
+    client = mongo_clients.get_client("localhost", 27017)
+    with patch.object(client, "close") as close:
+        mongo_clients.close_all()
+    close.assert_called_once()
+    assert not mongo_clients._clients
+    assert mongo_clients.get_client("localhost", 27017) is not client
+
+def test_forget_clients():
+    client = mongo_clients.get_client("localhost", 27017)
+    with patch.object(client, "close") as close:
+        mongo_clients._forget_clients()
+    # the parent's sockets are left alone
+    close.assert_not_called()
+    assert not mongo_clients._clients
+    assert mongo_clients.get_client("localhost", 27017) is not client
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+import mongomock
+import pytest
+from pymongo.errors import BulkWriteError
+from user_status import UserStatusCollection
+
+
+def status_row(status_id):
+    return {"_id": status_id, "user_id": status_id.split("_")[0],
+            "status_text": f"status {status_id}"}
+
+@pytest.fixture
+def status_collection():
+    return UserStatusCollection(None, None, "database", "StatusUpdates", client = mongomock.MongoClient())
+
+def test_batch_load_statuses(status_collection):
+    results = status_collection.batch_load_statuses([status_row("user_first"), status_row("user_second")])
+    assert results == {"inserted": 2, "duplicates": []}
+    assert status_collection.database.count_documents({}) == 2
+
+def test_batch_load_statuses_empty(status_collection):
+    assert status_collection.batch_load_statuses([]) == {"inserted": 0, "duplicates": []}
+
+def test_batch_load_statuses_duplicates(status_collection):
+    status_collection.batch_load_statuses([status_row("user_first"), status_row("user_second")])
+    results = status_collection.batch_load_statuses([status_row("user_first"), status_row("user_third"),
+                                                    status_row("user_second"), status_row("user_fourth")])
+    assert results == {"inserted": 2, "duplicates": ["user_first", "user_second"]}
+    assert sorted(status["_id"] for status in status_collection.database.find()) == \
+        ["user_first", "user_fourth", "user_second", "user_third"]
+
+def test_batch_load_statuses_other_error(status_collection):
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "op": status_row("user_first")},
+                                            {"index": 1, "code": 121, "op": status_row("user_second")}],
+                            "nInserted": 0})
+    status_collection.database = MagicMock()
+    status_collection.database.insert_many.side_effect = error
+    with pytest.raises(BulkWriteError):
+        status_collection.batch_load_statuses([status_row("user_first"), status_row("user_second")])
+
+def test_init_creates_no_indexes():
+    client = mongomock.MongoClient()
+    UserStatusCollection(None, None, "database", "StatusUpdates", client = client)
+    assert "StatusUpdates" not in client["database"].list_collection_names()
+
+def test_search_all_status_updates(status_collection):
+    status_collection.batch_load_statuses([status_row("user_first"), status_row("user_second"),
+                                           status_row("other_first")])
+    results = status_collection.search_all_status_updates("user", projection = ["status_text"])
+    assert len(results) == 2
+    assert [status["status_text"] for status in results] == \
+        ["status user_first", "status user_second"]
+    # every loop opens a new cursor
+    assert len(list(results)) == 2
+    assert [status["_id"] for status in results.page(1, 1)] == ["user_second"]
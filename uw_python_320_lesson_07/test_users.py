@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock
+import mongomock
+import pytest
+from pymongo.errors import BulkWriteError
+from users import UserCollection, UserIdCache
+
+
+def user_row(user_id):
+    return {"_id": user_id, "user_email": f"{user_id}@user.com",
+            "user_name": user_id, "user_last_name": "user"}
+
+@pytest.fixture
+def user_collection():
+    return UserCollection(None, None, "database", "UserAccounts", client = mongomock.MongoClient())
+
+def test_batch_load_users(user_collection):
+    results = user_collection.batch_load_users([user_row("first"), user_row("second")])
+    assert results == {"inserted": 2, "duplicates": []}
+    assert user_collection.database.count_documents({}) == 2
+
+def test_batch_load_users_empty(user_collection):
+    assert user_collection.batch_load_users([]) == {"inserted": 0, "duplicates": []}
+
+def test_batch_load_users_duplicates(user_collection):
+    user_collection.batch_load_users([user_row("first"), user_row("second")])
+    results = user_collection.batch_load_users([user_row("first"), user_row("third"),
+                                                user_row("second"), user_row("fourth")])
+    assert results == {"inserted": 2, "duplicates": ["first", "second"]}
+    assert sorted(user["_id"] for user in user_collection.database.find()) == \
+        ["first", "fourth", "second", "third"]
+
+def test_batch_load_users_other_error(user_collection):
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "op": user_row("first")},
+                                            {"index": 1, "code": 121, "op": user_row("second")}],
+                            "nInserted": 0})
+    user_collection.database = MagicMock()
+    user_collection.database.insert_many.side_effect = error
+    with pytest.raises(BulkWriteError):
+        user_collection.batch_load_users([user_row("first"), user_row("second")])
+
+def test_user_id_cache(user_collection):
+    user_collection.batch_load_users([user_row("first"), user_row("second")])
+    user_id_cache = UserIdCache(user_collection)
+    assert user_id_cache.user_ids == {"first", "second"}
+    assert "first" in user_id_cache
+    assert "third" not in user_id_cache
+    # new users are only seen after a refresh
+    user_collection.batch_load_users([user_row("third")])
+    assert "third" not in user_id_cache
+    user_id_cache.refresh()
+    assert "third" in user_id_cache
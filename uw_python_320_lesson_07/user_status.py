@@ -3,18 +3,78 @@ classes to manage the user status messages
 '''
 # pylint: disable=R0903, E0401
 from datetime import datetime
-from pymongo import MongoClient
+from mongo_clients import get_client
+from pymongo import ASCENDING, TEXT, UpdateOne
+from pymongo.errors import BulkWriteError
+from users import DUPLICATE_KEY_ERROR
+
+# statuses fetched from the server per round trip while iterating
+STATUS_BATCH_SIZE = 100
+
+class StatusResults():
+    '''
+    Lazy results of a status query
+
+    Nothing is sent to the server until the results are iterated or
+    len() is called. Each iteration opens a new cursor that streams
+    the statuses batch_size at a time, so the results can be looped
+    over more than once. len() runs count_documents once and caches
+    it, which is a second query, so callers that stream the statuses
+    should count them as they go instead.
+    '''
+
+    def __init__(self, database, query, projection = None, batch_size = STATUS_BATCH_SIZE,
+                 skip = 0, limit = 0):
+        self.database = database
+        self.query = query
+        self.projection = projection
+        self.batch_size = batch_size
+        self.skip = skip
+        self.limit = limit
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            options = {"skip": self.skip} if self.skip else {}
+            if self.limit:
+                options["limit"] = self.limit
+            self._count = self.database.count_documents(self.query, **options)
+        return self._count
+
+    def __iter__(self):
+        return self.database.find(self.query, self.projection, skip = self.skip,
+                                  limit = self.limit, batch_size = self.batch_size)
+
+    def page(self, skip, limit):
+        '''
+        Returns new lazy results for limit statuses after the first skip
+        '''
+        return StatusResults(self.database, self.query, self.projection,
+                             self.batch_size, skip, limit)
 
 class UserStatusCollection():
     '''
     Collection of UserStatus messages
     '''
 
-    def __init__(self, host, port, database_name, table_name):
-        client = MongoClient(host = host, port = port)
+    def __init__(self, host, port, database_name, table_name, client = None):
+        if client is None:
+            client = get_client(host, port)
         database = client[database_name][table_name]
         self.database = database
 
+    def ensure_indexes(self):
+        """
+        Creates the indexes used by status searches if they are missing
+
+        Called once by main.init_status_collection rather than on every
+        instance, so creating a collection object does no I/O.
+        """
+        # search_all_status_updates filters on user_id
+        self.database.create_index([("user_id", ASCENDING)])
+        # filter_status_by_words uses $text search
+        self.database.create_index([("status_text", TEXT)])
+
     def add_status(self, status_id, user_id, status_text):
         '''
         add a new status message to the collection
@@ -31,30 +91,52 @@ class UserStatusCollection():
     def batch_load_statuses(self, data):
         """
         Adds new statuses to the collection with a batch load
+
+        The batch is sent in one unordered insert_many, so statuses
+        whose _id already exists are skipped and the rest are still
+        inserted. Returns the number inserted and the duplicate _ids.
         """
-        for row in data:
-            if self.search_status(row["_id"]):
-                # Rejects new status batch if it contains a duplicate
-                return False
-        self.database.insert_many(data)
-        return True
+        if not data:
+            return {"inserted": 0, "duplicates": []}
+        try:
+            results = self.database.insert_many(data, ordered=False)
+            return {"inserted": len(results.inserted_ids), "duplicates": []}
+        except BulkWriteError as error:
+            write_errors = error.details["writeErrors"]
+            if any(write_error["code"] != DUPLICATE_KEY_ERROR for write_error in write_errors):
+                raise
+            return {"inserted": error.details["nInserted"],
+                    "duplicates": [write_error["op"]["_id"] for write_error in write_errors]}
 
     def modify_status(self, status_id, user_id, status_text):
         '''
         Modifies a status message
 
         The new user_id and status_text are assigned to the existing message
+        with one update_one on _id, the status exists if it matched.
         '''
-        results = self.search_status(status_id)
-        if not results:
+        data = {"user_id": user_id,
+                "status_text": status_text}
+        results = self.database.update_one({"_id": status_id}, {"$set": data})
+        if not results.matched_count:
             # rejects a status that DNE
             return False
-        data = {"_id": status_id,
-                "user_id": user_id,
-                "status_text": status_text}
-        self.database.update_one(results, {"$set": data})
         return True
 
+    def bulk_modify(self, updates):
+        '''
+        Modifies many status messages with one bulk_write
+
+        updates maps each status_id to a dict of the fields to change.
+        Returns the number of statuses matched and modified.
+        '''
+        requests = [UpdateOne({"_id": status_id}, {"$set": data})
+                    for status_id, data in updates.items()]
+        if not requests:
+            return {"matched": 0, "modified": 0}
+        results = self.database.bulk_write(requests, ordered = False)
+        return {"matched": results.matched_count, "modified": results.modified_count}
+
 
     def delete_status(self, status_id):
         '''
@@ -66,6 +148,17 @@ class UserStatusCollection():
         self.database.delete_one({"_id": status_id})
         return True
 
+    def delete_user_statuses(self, user_ids, session = None):
+        '''
+        Deletes every status belonging to the users in user_ids
+        with one delete_many on the user_id index
+
+        Returns the number of statuses deleted.
+        '''
+        results = self.database.delete_many({"user_id": {"$in": list(user_ids)}},
+                                            session = session)
+        return results.deleted_count
+
     def search_status(self, status_id):
         '''
         Find and return a status message by its status_id
@@ -78,14 +171,28 @@ class UserStatusCollection():
             return False
         return results
 
-    def search_all_status_updates(self, user_id):
+    def search_all_status_updates(self, user_id, projection = None,
+                                  batch_size = STATUS_BATCH_SIZE, skip = 0, limit = 0):
         """
-        Returns all status updates for a user
+        Returns all status updates for a user as lazy StatusResults
+
+        Only the fields in projection are fetched when it is given,
+        and skip and limit select one page of the statuses.
         """
         query = {"user_id": user_id}
-        len_of_results = self.database.count_documents(query)
+        return StatusResults(self.database, query, projection, batch_size, skip, limit)
+
+    def filter_status_by_words(self, words):
+        """
+        Returns all statuses containing any of the words, using the
+        text index instead of scanning every status
+
+        Words are matched whole and stemmed, use filter_status_by_string
+        to match any substring.
+        """
+        query = {"$text": {"$search": words}}
         results = self.database.find(query)
-        return len_of_results, results
+        return results
 
     def filter_status_by_string(self, phrase):
         """
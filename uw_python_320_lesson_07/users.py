@@ -2,15 +2,21 @@
 Classes for user information for the social network project
 '''
 # pylint: disable=R0903, E0401
-from pymongo import MongoClient
+from mongo_clients import get_client
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# mongo error code for inserting an _id that already exists
+DUPLICATE_KEY_ERROR = 11000
 
 class UserCollection():
     '''
     Contains a collection of Users objects
     '''
 
-    def __init__(self, host, port, database_name, table_name):
-        client = MongoClient(host = host, port = port)
+    def __init__(self, host, port, database_name, table_name, client = None):
+        if client is None:
+            client = get_client(host, port)
         database = client[database_name][table_name]
         self.database = database
 
@@ -31,28 +37,51 @@ class UserCollection():
     def batch_load_users(self, data):
         """
         Adds new users to the collection with a batch load
+
+        The batch is sent in one unordered insert_many, so users
+        whose _id already exists are skipped and the rest are still
+        inserted. Returns the number inserted and the duplicate _ids.
         """
-        for row in data:
-            if self.search_user(row["_id"]):
-                # Rejects new user batch if it contains a duplicate
-                return False
-        self.database.insert_many(data)
-        return True
+        if not data:
+            return {"inserted": 0, "duplicates": []}
+        try:
+            results = self.database.insert_many(data, ordered=False)
+            return {"inserted": len(results.inserted_ids), "duplicates": []}
+        except BulkWriteError as error:
+            write_errors = error.details["writeErrors"]
+            if any(write_error["code"] != DUPLICATE_KEY_ERROR for write_error in write_errors):
+                raise
+            return {"inserted": error.details["nInserted"],
+                    "duplicates": [write_error["op"]["_id"] for write_error in write_errors]}
 
     def modify_user(self, user_id, email, user_name, user_last_name):
         '''
         Modifies an existing user
+
+        Sends one update_one on _id, the user exists if it matched.
         '''
-        results = self.search_user(user_id)
-        if not results:
-            return False
-        data = {"_id": user_id,
-                "user_email": email,
+        data = {"user_email": email,
                 "user_name": user_name,
                 "user_last_name": user_last_name}
-        self.database.update_one(results, {"$set": data})
+        results = self.database.update_one({"_id": user_id}, {"$set": data})
+        if not results.matched_count:
+            return False
         return True
 
+    def bulk_modify(self, updates):
+        '''
+        Modifies many existing users with one bulk_write
+
+        updates maps each user_id to a dict of the fields to change.
+        Returns the number of users matched and modified.
+        '''
+        requests = [UpdateOne({"_id": user_id}, {"$set": data})
+                    for user_id, data in updates.items()]
+        if not requests:
+            return {"matched": 0, "modified": 0}
+        results = self.database.bulk_write(requests, ordered = False)
+        return {"matched": results.matched_count, "modified": results.modified_count}
+
     def delete_user(self, user_id):
         '''
         Deletes an existing user
@@ -62,6 +91,15 @@ class UserCollection():
         self.database.delete_one({"_id": user_id})
         return True
 
+    def delete_users(self, user_ids, session = None):
+        '''
+        Deletes every user in user_ids with one delete_many
+
+        Returns the number of users deleted.
+        '''
+        results = self.database.delete_many({"_id": {"$in": list(user_ids)}}, session = session)
+        return results.deleted_count
+
     def search_user(self, user_id):
         '''
         Searches for user data
@@ -71,12 +109,29 @@ class UserCollection():
             return False
         return results
     
-    def count_users_with_id(self, user_ids):
+    def get_all_user_ids(self):
         """
-        Searches multiple users
+        Returns the set of every user_id with one projection-only query
         """
-        query = {"_id": {"$in": user_ids}}
-        results = self.database.count_documents(query)
-        if not results:
-            return 0
-        return results
+        return {user["_id"] for user in self.database.find({}, {"_id": 1})}
+
+
+class UserIdCache():
+    '''
+    In-memory set of every user_id in a UserCollection, used to check
+    statuses for a missing user without a query per batch
+    '''
+
+    def __init__(self, user_collection):
+        self.user_collection = user_collection
+        self.user_ids = set()
+        self.refresh()
+
+    def refresh(self):
+        '''
+        Reloads the user_ids, for example after new users were added
+        '''
+        self.user_ids = self.user_collection.get_all_user_ids()
+
+    def __contains__(self, user_id):
+        return user_id in self.user_ids
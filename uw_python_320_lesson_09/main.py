@@ -1,9 +1,10 @@
 '''
 main driver for a simple social network project
 '''
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from csv import DictReader
 import sys
-from os import path, makedirs, listdir
+from os import path, makedirs, scandir
 from loguru import logger
 from peewee import IntegrityError
 from sqlite3 import IntegrityError as IntegretyError2
@@ -16,6 +17,8 @@ logger.remove()
 logger.add('logs_{time:YYYY-MM-DD}.log', level="DEBUG")
 logger.add(sys.stderr, level="DEBUG")
 
+PICTURE_SCAN_WORKERS = 8
+
 
 def load_users(filename, table):
     '''
@@ -275,31 +278,67 @@ def deconstruct_tags(tags):
     # first slot will be empty so skip it and return sorted list
     return sorted(tags_list[1:])
 
-def get_all_user_pictures(user_id):
+def scan_picture_directory(dir_path):
     '''
-    Returns all pictures for a user
+    Lists one picture directory and returns its sub directories
+    and the (directory, path, file name) of every picture in it
+
+    Uses scandir so file types come from the directory listing
+    instead of one stat call per entry. Symlinks to directories
+    are skipped, so a link back up the tree can't loop forever.
     '''
-    picture_paths = []
-    start_path = path.join("pictures", user_id)
-    if path.isdir(start_path):
-        walk_user_picture_directories(start_path, picture_paths)
-        return picture_paths
-    else:
-        return None
+    sub_dirs = []
+    files = []
+    with scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            elif not entry.is_dir():
+                files.append((dir_path, entry.path, entry.name))
+    return sub_dirs, files
 
-def walk_user_picture_directories(current_path, path_list):
+def walk_picture_tree(start_path):
+    '''
+    Walks a picture directory without recursion and yields
+    (directory, path, file name) for every picture in it
     '''
-    Walk user picture directories and get all paths
+    pending = [start_path]
+    while pending:
+        sub_dirs, files = scan_picture_directory(pending.pop())
+        pending.extend(sub_dirs)
+        yield from files
+
+def iter_all_user_pictures(start_path="pictures", max_workers=PICTURE_SCAN_WORKERS):
     '''
-    if path.isfile(current_path):
-        user_id = path.split(current_path)[0]
-        file_name = path.split(current_path)[-1]
-        path_list.append((user_id, current_path, file_name))
-        return
-    for sub_path in listdir(current_path):
-        new_path = path.join(current_path, sub_path)
-        walk_user_picture_directories(new_path, path_list)
-    return path_list
+    Yields every picture under start_path, listing directories on
+    a thread pool
+
+    Each directory's pictures are yielded as soon as it has been
+    listed, so only the listings in progress are held in memory.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {executor.submit(scan_picture_directory, start_path)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                sub_dirs, files = future.result()
+                running.update(executor.submit(scan_picture_directory, sub_dir)
+                               for sub_dir in sub_dirs)
+                yield from files
+
+def get_all_user_pictures(user_id):
+    '''
+    Yields all pictures for a user, or for every user if
+    user_id is empty
+
+    Returns None if there is no picture directory for the user.
+    '''
+    start_path = path.join("pictures", user_id)
+    if not path.isdir(start_path):
+        return None
+    if user_id:
+        return walk_picture_tree(start_path)
+    return iter_all_user_pictures(start_path)
 
 def reconcile_pictures(table):
     '''
@@ -252,11 +252,11 @@ def list_user_pictures():
     Lists all pictures for a user
     """
     user_id = input("User ID: ")
-    pictures = main.get_all_user_pictures(user_id)
-    if pictures:
-        for picture in pictures:
-            print(picture)
-    else:
+    found = False
+    for picture in main.get_all_user_pictures(user_id) or []:
+        print(picture)
+        found = True
+    if not found:
         print("No pictures found for user")
 
 def reconcile_pictures():
@@ -1,62 +1,140 @@
 """API used for social media app"""
 # pylint: disable=R0903,R0201
-from flask import Flask, jsonify
+import json
+from functools import partial
+from queue import Empty
+from flask import Flask, Response, abort, g, jsonify, request, stream_with_context
 from flask_restful import Resource, Api
 import main
-from connection import Connection
+from connection import ConnectionPool
 
 app = Flask(__name__)
 api = Api(app)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# seconds a request waits for a free connection
+POOL_TIMEOUT = 10
+
+pool = None
+
+@app.before_request
+def acquire_connection():
+    """
+    Gives each request its own connection from the pool
+
+    Answers 503 if every connection stays busy for POOL_TIMEOUT.
+    """
+    try:
+        g.connection = pool.acquire(timeout=POOL_TIMEOUT)
+    except Empty:
+        abort(503, description="No database connection is available, try again later")
+
+@app.teardown_request
+def release_connection(_exception):
+    """Returns the request's connection to the pool"""
+    connection = g.pop("connection", None)
+    if connection is not None:
+        pool.release(connection)
+
+def get_page_args():
+    """Reads the after cursor and page size from the query string"""
+    after = request.args.get("after")
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return after, max(1, min(limit, MAX_PAGE_SIZE))
+
+def wants_ndjson():
+    """Checks if the client asked for a streamed full export"""
+    return request.args.get("format") == "ndjson"
+
+def stream_ndjson(rows):
+    """Streams rows one json document per line without building a list"""
+    def generate():
+        for row in rows:
+            yield json.dumps(row) + "\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def add_statuses(users):
+    """Attaches each user's statuses using one query for the whole page"""
+    statuses = main.get_user_statuses([user["user_id"] for user in users],
+                                      g.connection.status_table)
+    for user in users:
+        user["statuses"] = statuses[user["user_id"]]
+    return users
+
+def paginate(get_page, name, key, expand=None):
+    """
+    Returns one page of rows and the cursor for the next page
+
+    One extra row is fetched to know if there is a next page.
+    If given, expand is called once with the whole page of rows.
+    """
+    after, limit = get_page_args()
+    rows = get_page(after=after, limit=limit + 1)
+    next_after = rows[limit - 1][key] if len(rows) > limit else None
+    rows = rows[:limit]
+    if expand:
+        rows = expand(rows)
+    return jsonify({name: rows, "next_after": next_after})
+
 class AllUsers(Resource):
-    """Displays all users in db up to limit"""
+    """Displays a page of users in the db, or all of them as ndjson"""
     def get(self):
         """Get method"""
-        user_limit = 50
-        users = main.get_all_users(user_table)
-        user_counter = 1
-        user_list = []
-        for user in users:
-            user_list.append(user)
-            user_counter += 1
-            if user_counter == user_limit:
-                break
-        return jsonify(user_list)
+        if wants_ndjson():
+            return stream_ndjson(main.get_all_users(g.connection.user_table).iterator())
+        expand = add_statuses if request.args.get("include") == "statuses" else None
+        return paginate(partial(main.get_users_page, g.connection.user_table),
+                        "users", "user_id", expand=expand)
 
 class UserDetail(Resource):
     """Displays user detail"""
     def get(self, user_id):
         """Get method"""
-        user = main.search_user(user_id, user_table)
+        user = main.search_user(user_id, g.connection.user_table)
         return jsonify(user)
 
+class UserStatuses(Resource):
+    """Displays all statuses for a user"""
+    def get(self, user_id):
+        """Get method"""
+        statuses = main.get_user_statuses([user_id], g.connection.status_table)
+        return jsonify(statuses[user_id])
+
 class AllPictures(Resource):
-    """Displays all pictures in db"""
+    """
+    Displays a page of pictures in the db, or all of them as ndjson
+
+    ?tag= may be repeated to find pictures with every tag, and
+    ?any_tag= to find pictures with at least one of the tags.
+    """
     def get(self):
         """Get method"""
-        picture_limit = 50
-        pictures = main.get_all_pictures(picture_table)
-        picture_counter = 1
-        picture_list = []
-        for picture in pictures:
-            picture_list.append(picture)
-            picture_counter += 1
-            if picture_counter == picture_limit:
-                break
-        return jsonify(picture_list)
+        if wants_ndjson():
+            return stream_ndjson(main.get_all_pictures(g.connection.picture_table).iterator())
+        all_of = request.args.getlist("tag")
+        any_of = request.args.getlist("any_tag")
+        if all_of or any_of:
+            return paginate(partial(main.search_pictures_by_tags, g.connection.picture_table,
+                                    all_of=all_of, any_of=any_of),
+                            "pictures", "picture_id")
+        return paginate(partial(main.get_pictures_page, g.connection.picture_table),
+                        "pictures", "picture_id")
 
 class PictureDetail(Resource):
     """Displays picture details"""
     def get(self, picture_id):
         """Get method"""
-        picture = main.search_picture(picture_id, picture_table)
+        picture = main.search_picture(picture_id, g.connection.picture_table)
         return jsonify(picture)
 
 class ReconcilePictures(Resource):
     """Displays differences in pictures in the db and local"""
     def get(self):
         """Get method"""
-        missing_from_db, missing_from_local = main.reconcile_pictures(picture_table)
+        full = request.args.get("full", "").lower() in ("1", "true")
+        missing_from_db, missing_from_local = main.reconcile_pictures(g.connection.picture_table,
+                                                                      full=full)
         return jsonify({"missing_from_db": missing_from_db,
                         "missing_from_local": missing_from_local})
 
@@ -81,13 +159,11 @@ def generate_picture_html(picture):
 
 api.add_resource(AllUsers, "/users")
 api.add_resource(UserDetail,"/users/<string:user_id>")
+api.add_resource(UserStatuses,"/users/<string:user_id>/statuses")
 api.add_resource(AllPictures,"/images")
 api.add_resource(PictureDetail,"/images/<string:picture_id>")
 api.add_resource(ReconcilePictures,"/differences")
 
 if __name__ == "__main__":
-    with Connection() as connection:
-        user_table = connection.user_table
-        status_table = connection.status_table
-        picture_table = connection.picture_table
-        app.run(debug=True)
+    with ConnectionPool() as pool:
+        app.run(debug=True, threaded=True)
@@ -1,22 +1,36 @@
 """
-Connection context manager
+Connection context manager and connection pool
 """
 
+from queue import LifoQueue, Empty
+from threading import Lock
+from peewee import SqliteDatabase
 from playhouse.dataset import DataSet
+from pragma_profiles import get_pragmas
 import socialnetwork_model
 
+DATABASE_FILE = "socialnetwork.db"
+TABLE_NAMES = ("users", "status", "pictures")
+POOL_SIZE = 8
+
 class Connection():
     """
     Creates a sqlite connection as a context manager
     """
-    def __init__(self):
+    def __init__(self, database_file=DATABASE_FILE, table_names=TABLE_NAMES, profile=None):
         """
-        Creates the database
+        Creates the database using a pragma profile from pragma_profiles
+
+        The sqlite connection is not tied to the thread that opened
+        it, so a pool can hand it to one request thread at a time.
         """
-        self.ds = DataSet('sqlite:///socialnetwork.db')
-        self.user_table = self.ds['users']
-        self.status_table = self.ds['status']
-        self.picture_table = self.ds["pictures"]
+        database = SqliteDatabase(database_file, pragmas=get_pragmas(profile),
+                                  thread_safe=False, check_same_thread=False)
+        self.ds = DataSet(database)
+        user_table, status_table, picture_table = table_names
+        self.user_table = self.ds[user_table]
+        self.status_table = self.ds[status_table]
+        self.picture_table = self.ds[picture_table]
 
     def __enter__(self):
         """
@@ -29,3 +43,81 @@ class Connection():
         Removes the connection to the database
         """
         self.ds.close()
+
+class ConnectionPool():
+    """
+    Hands out up to size Connections, each used by one thread at a time
+    """
+    def __init__(self, size=POOL_SIZE, database_file=DATABASE_FILE,
+                 table_names=TABLE_NAMES, profile="serving"):
+        """
+        Creates an empty pool, connections are opened as needed
+
+        The serving profile uses WAL so readers don't block the
+        writer, and a busy timeout instead of "database is locked".
+        """
+        # fail early on an unknown profile
+        get_pragmas(profile)
+        self.size = size
+        self.database_file = database_file
+        self.table_names = table_names
+        self.profile = profile
+        self._idle = LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Returns an idle connection, opening a new one if the pool
+        is not full, otherwise waits for one to be released
+
+        Raises queue.Empty if no connection is released within timeout.
+        """
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return Connection(self.database_file, self.table_names, self.profile)
+            except Exception:
+                # give the slot back so the pool can open it again
+                with self._lock:
+                    self._opened -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool
+        """
+        self._idle.put_nowait(connection)
+
+    def close_all(self):
+        """
+        Closes every idle connection in the pool
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except Empty:
+                return
+            connection.ds.close()
+            with self._lock:
+                self._opened -= 1
+
+    def __enter__(self):
+        """
+        Uses the pool as a context manager
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """
+        Closes the pool's connections
+        """
+        self.close_all()
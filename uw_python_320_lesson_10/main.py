@@ -1,21 +1,37 @@
 '''
 main driver for a simple social network project
 '''
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from csv import DictReader
+from itertools import islice
+import json
+import sqlite3
 import sys
-from os import path, makedirs, listdir
+from os import path, makedirs, replace, scandir, stat
 from sqlite3 import IntegrityError as IntegretyError2
+from threading import Lock
 from loguru import logger
 from peewee import IntegrityError
 
 import users
 import user_status
 import pictures
+from pragma_profiles import get_database, use_profile
 
 logger.remove()
 logger.add('logs_{time:YYYY-MM-DD}.log', level="DEBUG")
 logger.add(sys.stderr, level="DEBUG")
 
+BULK_CHUNK_SIZE = 500
+# sqlite's default limit on ? in one statement before version 3.32
+MIN_MAX_VARIABLES = 999
+# pragma profile used while loading csv files
+LOAD_PROFILE = "bulk_load"
+RECONCILE_INDEX = "reconcile_index.json"
+PICTURE_SCAN_WORKERS = 8
+# reconcile index files are read and written by one thread at a time
+_reconcile_lock = Lock()
+
 
 def load_users(filename, table):
     '''
@@ -32,7 +48,8 @@ def load_users(filename, table):
     - Otherwise, it returns True.
     '''
     try:
-        with open(filename, "r", encoding="utf-8") as user_file:
+        with use_profile(get_database(table), LOAD_PROFILE), \
+                open(filename, "r", encoding="utf-8") as user_file:
             csv_reader = DictReader(user_file)
             for row in csv_reader:
                 try:
@@ -53,6 +70,120 @@ def load_users(filename, table):
         return False
 
 
+def read_csv_chunks(csv_reader, chunk_size=BULK_CHUNK_SIZE):
+    '''
+    Yields lists of up to chunk_size rows from a csv reader
+    '''
+    while True:
+        chunk = list(islice(csv_reader, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_bulk_chunk_size(table, chunk_size=BULK_CHUNK_SIZE):
+    '''
+    Returns chunk_size, lowered if needed so one insert of that
+    many rows into table stays under sqlite's limit on bound
+    variables
+    '''
+    try:
+        max_variables = get_database(table).connection().getlimit(
+            sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    # getlimit is new in python 3.11
+    except AttributeError:
+        max_variables = MIN_MAX_VARIABLES
+    return max(1, min(chunk_size, max_variables // len(table.columns)))
+
+
+def is_complete(row):
+    '''
+    Checks that no field of a csv row is empty
+    '''
+    return all(row.values())
+
+
+def load_users_bulk(filename, table, chunk_size=BULK_CHUNK_SIZE):
+    '''
+    Streams a CSV file with user data into the users table
+    chunk_size rows at a time, one transaction per chunk
+
+    Requirements:
+    - If a user_id already exists, it is skipped and counted
+    as a duplicate.
+    - If a row has an empty field, it is skipped and counted
+    as invalid.
+    - Returns False if the file cannot be opened.
+    - Otherwise, it returns a report dict with the number of
+    loaded, duplicate and invalid rows.
+    '''
+    report = {"loaded": 0, "duplicates": 0, "invalid": 0}
+    insert_users = users.add_users_bulk(table)
+    chunk_size = get_bulk_chunk_size(table, chunk_size)
+    try:
+        with use_profile(get_database(table), LOAD_PROFILE), \
+                open(filename, "r", encoding="utf-8") as user_file:
+            for chunk in read_csv_chunks(DictReader(user_file), chunk_size):
+                rows = [{"user_id": row['USER_ID'],
+                         "user_email": row['EMAIL'],
+                         "user_name": row['NAME'],
+                         "user_last_name": row['LASTNAME']} for row in chunk
+                        if is_complete(row)]
+                inserted = insert_users(rows)
+                report["loaded"] += inserted
+                report["duplicates"] += len(rows) - inserted
+                report["invalid"] += len(chunk) - len(rows)
+    except FileNotFoundError:
+        logger.debug(f"File with name {filename} could not be accessed")
+        print("The file was not found")
+        return False
+    logger.info(f"Bulk loaded users from file {filename}: {report}")
+    return report
+
+
+def load_status_updates_bulk(filename, table_status, table_users,
+                             chunk_size=BULK_CHUNK_SIZE):
+    '''
+    Streams a CSV file with status data into the status table
+    chunk_size rows at a time, one transaction per chunk
+
+    Requirements:
+    - If a status_id already exists, it is skipped and counted
+    as a duplicate.
+    - If a status belongs to a user that does not exist, it is
+    skipped and counted as orphaned.
+    - If a row has an empty field, it is skipped and counted
+    as invalid.
+    - Returns False if the file cannot be opened.
+    - Otherwise, it returns a report dict with the number of
+    loaded, duplicate, orphaned and invalid rows.
+    '''
+    report = {"loaded": 0, "duplicates": 0, "orphaned": 0, "invalid": 0}
+    insert_statuses = user_status.add_statuses_bulk(table_status)
+    known_user_ids = users.get_all_user_ids(table_users)
+    chunk_size = get_bulk_chunk_size(table_status, chunk_size)
+    try:
+        with use_profile(get_database(table_status), LOAD_PROFILE), \
+                open(filename, "r", encoding="utf-8") as csv_file:
+            for chunk in read_csv_chunks(DictReader(csv_file), chunk_size):
+                complete = [row for row in chunk if is_complete(row)]
+                rows = [{"status_id": row["STATUS_ID"],
+                         "user_id": row["USER_ID"],
+                         "status_text": row["STATUS_TEXT"]} for row in complete
+                        if row["USER_ID"] in known_user_ids]
+                inserted = insert_statuses(rows)
+                report["loaded"] += inserted
+                report["duplicates"] += len(rows) - inserted
+                report["orphaned"] += len(complete) - len(rows)
+                report["invalid"] += len(chunk) - len(complete)
+    except FileNotFoundError:
+        logger.error(f"File with name '{filename}' could not be accessed")
+        print("The file was not found")
+        return False
+    logger.info(f"Bulk loaded statuses from file '{filename}': {report}")
+    return report
+
+
 def add_status(status_id, user_id, status_text, table_status, table_users):
     '''
     Creates a new instance of UserStatus and stores it in
@@ -85,7 +216,8 @@ def load_status_updates(filename, table_status, table_users):
     '''
 
     try:
-        with open(filename, "r", encoding="utf-8") as csv_file:
+        with use_profile(get_database(table_status), LOAD_PROFILE), \
+                open(filename, "r", encoding="utf-8") as csv_file:
             reader = DictReader(csv_file)
             for row in reader:
                 try:
@@ -170,6 +302,10 @@ def get_all_users(table):
     """Retrieves all users in the db"""
     return users.get_all_users(table)
 
+def get_users_page(table, after=None, limit=50):
+    """Retrieves up to limit users with a user_id after the cursor"""
+    return users.get_users_page(table)(after=after, limit=limit)
+
 def update_status(status_id, user_id, status_text, table_users, table_status):
     '''
     Updates the values of an existing status_id
@@ -212,16 +348,42 @@ def search_status(status_id, table):
     search_status_inner = user_status.search_status(table)
     return search_status_inner(status_id=status_id)
 
+def get_user_statuses(user_ids, table):
+    '''
+    Gets the statuses of every user in user_ids with one query,
+    grouped by user_id
+    '''
+    get_statuses = user_status.get_user_statuses(table)
+    return get_statuses(user_ids)
+
 def add_picture(user_id, tags, table_users, table_pictures):
     '''
     Adds a picture to the db
+
+    Returns the new picture_id, or False if it could not be added.
     '''
     if not search_user(user_id, table_users):
         print("Unable to add picture, user does not exist")
         return False
-    add_picture_to_db = pictures.add_picture(table_pictures)
-    picture_id = pictures.create_key(table_pictures)
-    return add_picture_to_db(picture_id=picture_id, user_id=user_id, tags=tags)
+    add_picture_to_db = pictures.add_pictures(table_pictures)
+    picture_ids = add_picture_to_db([{"user_id": user_id, "tags": tags}])
+    return picture_ids[0] if picture_ids else False
+
+def add_pictures(new_pictures, table_users, table_pictures):
+    '''
+    Adds many pictures to the db at once
+
+    new_pictures is a list of (user_id, tags) pairs. Returns the list
+    of new picture ids, or False if any user does not exist.
+    '''
+    user_ids = {user_id for user_id, _ in new_pictures}
+    missing_users = user_ids - users.get_existing_user_ids(table_users)(user_ids)
+    if missing_users:
+        print(f"Unable to add pictures, users {sorted(missing_users)} do not exist")
+        return False
+    add_pictures_to_db = pictures.add_pictures(table_pictures)
+    return add_pictures_to_db([{"user_id": user_id, "tags": tags}
+                               for user_id, tags in new_pictures])
 
 def update_picture(picture_id, user_id, tags, table_users, table_pictures):
     '''
@@ -232,7 +394,8 @@ def update_picture(picture_id, user_id, tags, table_users, table_pictures):
             print("Unable to update picture, user does not exist")
             return False
         update_picture_in_db = pictures.modify_picture(table_pictures)
-        return update_picture_in_db(picture_id=picture_id, user_id=user_id, tags=tags)
+        return update_picture_in_db(picture_id=picture_id, user_id=user_id, tags=tags,
+                                    columns=["picture_id"])
     print(f"Picture ID {picture_id} was not found")
     return False
 
@@ -254,6 +417,18 @@ def get_all_pictures(table):
     """Gets all pictures in the db"""
     return pictures.get_all_pictures(table)
 
+def get_pictures_page(table, after=None, limit=50):
+    """Gets up to limit pictures with a picture_id after the cursor"""
+    return pictures.get_pictures_page(table)(after=after, limit=limit)
+
+def search_pictures_by_tags(table, all_of=None, any_of=None, after=None, limit=None):
+    '''
+    Finds pictures that have every tag in all_of and at least
+    one tag in any_of
+    '''
+    search = pictures.search_pictures_by_tags(table)
+    return search(all_of=all_of, any_of=any_of, after=after, limit=limit)
+
 def save_all_pictures(table):
     '''
     Saves all pictures in the db
@@ -273,65 +448,261 @@ def save_all_pictures(table):
             pass
     return True
 
+def save_picture_directory(folder_path, file_names):
+    '''
+    Creates a picture directory once and writes any of its files
+    that are not already there
+
+    Returns the number of files created and skipped.
+    '''
+    makedirs(folder_path, exist_ok=True)
+    with scandir(folder_path) as entries:
+        existing = {entry.name for entry in entries}
+    created = 0
+    for file_name in file_names:
+        if file_name not in existing:
+            with open(path.join(folder_path, file_name), "w"):
+                pass
+            created += 1
+    return created, len(file_names) - created
+
+def save_all_pictures_batched(table, max_workers=PICTURE_SCAN_WORKERS):
+    '''
+    Saves all pictures in the db, grouped by directory
+
+    Each directory is created and listed once, files that already
+    exist are skipped, and directories are written on a thread
+    pool. Returns a dict with the number of files created and skipped.
+    '''
+    folders = {}
+    for pic in pictures.get_all_pictures(table):
+        folder_path = path.join("pictures", pic["user_id"], *deconstruct_tags(pic["tags"]))
+        folders.setdefault(folder_path, []).append(f"{pic['picture_id']}.png")
+    report = {"created": 0, "skipped": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for created, skipped in executor.map(save_picture_directory,
+                                             folders.keys(), folders.values()):
+            report["created"] += created
+            report["skipped"] += skipped
+    logger.info(f"Saved pictures: {report}")
+    return report
+
 def deconstruct_tags(tags):
     '''
     Deconstructs a string tags into a list of tags
     '''
-    # add extra space at start so split works
-    tags = " " + tags
-    tags_list = tags.split(" #")
-    # first slot will be empty so skip it and return sorted list
-    return sorted(tags_list[1:])
+    return pictures.deconstruct_tags(tags)
+
+def scan_picture_directory(dir_path):
+    '''
+    Lists one picture directory and returns its sub directories
+    and the (directory, path, file name) of every picture in it
+
+    Uses scandir so file types come from the directory listing
+    instead of one stat call per entry. Symlinks to directories
+    are skipped, so a link back up the tree can't loop forever.
+    '''
+    sub_dirs = []
+    files = []
+    with scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            elif not entry.is_dir():
+                files.append((dir_path, entry.path, entry.name))
+    return sub_dirs, files
+
+def walk_picture_tree(start_path):
+    '''
+    Walks a picture directory without recursion and yields
+    (directory, path, file name) for every picture in it
+    '''
+    pending = [start_path]
+    while pending:
+        sub_dirs, files = scan_picture_directory(pending.pop())
+        pending.extend(sub_dirs)
+        yield from files
+
+def iter_all_user_pictures(start_path="pictures", max_workers=PICTURE_SCAN_WORKERS):
+    '''
+    Yields every picture under start_path, listing directories on
+    a thread pool
+
+    Each directory's pictures are yielded as soon as it has been
+    listed, so only the listings in progress are held in memory.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {executor.submit(scan_picture_directory, start_path)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                sub_dirs, files = future.result()
+                running.update(executor.submit(scan_picture_directory, sub_dir)
+                               for sub_dir in sub_dirs)
+                yield from files
 
 def get_all_user_pictures(user_id):
     '''
-    Returns all pictures for a user
+    Yields all pictures for a user, or for every user if
+    user_id is empty
+
+    Returns None if there is no picture directory for the user.
     '''
-    picture_paths = []
     start_path = path.join("pictures", user_id)
-    if path.isdir(start_path):
-        walk_user_picture_directories(start_path, picture_paths)
-        return picture_paths
-    return None
+    if not path.isdir(start_path):
+        return None
+    if user_id:
+        return walk_picture_tree(start_path)
+    return iter_all_user_pictures(start_path)
+
+def get_picture_path(pic):
+    '''
+    Returns the local path a picture in the db should be saved to
+    '''
+    tags = deconstruct_tags(pic["tags"])
+    return path.join("pictures", pic["user_id"], *tags, pic["picture_id"] + ".png")
 
-def walk_user_picture_directories(current_path, path_list):
+def scan_user_picture_directory(user_path):
     '''
-    Walk user picture directories and get all paths
+    Finds every picture under a user directory
+
+    Returns a dict of picture_id to path and a dict of every
+    directory to its mtime. Each mtime is read before its
+    directory is listed so later changes are never missed.
     '''
-    if path.isfile(current_path):
-        user_id = path.split(current_path)[0]
-        file_name = path.split(current_path)[-1]
-        path_list.append((user_id, current_path, file_name))
-        return
-    for sub_path in listdir(current_path):
-        new_path = path.join(current_path, sub_path)
-        walk_user_picture_directories(new_path, path_list)
-    return path_list
+    files = {}
+    dir_mtimes = {}
+    pending = [user_path]
+    while pending:
+        current_path = pending.pop()
+        dir_mtimes[current_path] = stat(current_path).st_mtime_ns
+        sub_dirs, dir_files = scan_picture_directory(current_path)
+        pending.extend(sub_dirs)
+        for _, file_path, file_name in dir_files:
+            files[file_name[:-4]] = file_path
+    return files, dir_mtimes
 
-def reconcile_pictures(table):
+def is_directory_unchanged(dir_mtimes):
+    '''
+    Checks that every directory still has its recorded mtime
+    '''
+    try:
+        return all(stat(dir_path).st_mtime_ns == mtime
+                   for dir_path, mtime in dir_mtimes.items())
+    except FileNotFoundError:
+        return False
+
+def load_reconcile_index(index_file, table_name):
+    '''
+    Loads the reconciliation index saved by the last run
+
+    Returns None if there is no usable index for this table.
+    '''
+    try:
+        with open(index_file, "r", encoding="utf-8") as file:
+            index = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if index.get("table") != table_name:
+        return None
+    return index
+
+def save_reconcile_index(index_file, index):
+    '''
+    Saves the reconciliation index for the next run
+
+    The index is written to a temporary file first, so a reader
+    never sees a half written index.
+    '''
+    temp_file = f"{index_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as file:
+        json.dump(index, file)
+    replace(temp_file, index_file)
+
+def prune_reconcile_log(table, index_files=(RECONCILE_INDEX,)):
+    '''
+    Removes picture changes that every index in index_files has
+    already read from the change log
+
+    Any other index is rebuilt from a full scan the next time it
+    is used. Returns the number of changes removed.
+    '''
+    with _reconcile_lock:
+        indexes = [load_reconcile_index(index_file, table.name) for index_file in index_files]
+        seqs = [index["seq"] for index in indexes if index and index["seq"] is not None]
+        if not seqs:
+            return 0
+        return pictures.prune_change_log(table)(min(seqs))
+
+def reconcile_pictures(table, full=False, index_file=RECONCILE_INDEX):
     '''
     Returns pictures that were found in the db but not the local
     file system and vice versa
-    '''
-    # gets all picture data for tags and ids
-    db_pics_data = {}
-    for pic in pictures.get_all_pictures(table):
-        picture_id = pic["picture_id"]
-        tags = deconstruct_tags(pic["tags"])
-        pic_path = path.join("pictures", pic["user_id"], *tags, picture_id + ".png")
-        db_pics_data[picture_id] = pic_path
-    # if no folder in local, all pictures are missing from local
-    if not path.isdir("pictures"):
-        return None, [(pic_path, pic_id) for pic_id, pic_path in db_pics_data.items()]
-    # gets local picture data
+
+    The db and local pictures seen are saved in index_file. Later
+    runs only re-query pictures changed in the db since then and
+    only rescan user directories whose mtimes changed. Pass
+    full=True to ignore the index and rebuild it from scratch.
+    '''
+    with _reconcile_lock:
+        return reconcile_with_index(table, full, index_file)
+
+def reconcile_with_index(table, full, index_file):
+    '''
+    Runs reconcile_pictures, the caller must hold _reconcile_lock
+    '''
+    index = None if full else load_reconcile_index(index_file, table.name)
+    # without a change log every run re-queries the whole table
+    has_log = pictures.has_change_log(table)
+    changes = None
+    if index is not None and index["seq"] is not None and has_log:
+        # None if the changes since the index was saved were pruned
+        changes = pictures.get_changed_pictures(table)(index["seq"])
+    if changes is None:
+        index = {"table": table.name,
+                 "seq": pictures.get_last_change(table) if has_log else None,
+                 "db": {}, "dirs": {}}
+        changed_ids = None
+    else:
+        changed_ids, index["seq"] = changes
+    # gets all picture data for tags and ids, or just the changed ones
+    db_pics_data = index["db"]
+    if changed_ids is None:
+        pics = pictures.get_all_pictures(table)
+    else:
+        for picture_id in changed_ids:
+            db_pics_data.pop(picture_id, None)
+        pics = pictures.get_pictures_by_ids(table)(changed_ids)
+    for pic in pics:
+        db_pics_data[pic["picture_id"]] = get_picture_path(pic)
+    # gets local picture data, reusing unchanged user directories
     local_pics_data = {}
-    for file in get_all_user_pictures(""):
-        local_pics_data[file[2][:-4]] = file[1]
+    user_dirs = {}
+    if path.isdir("pictures"):
+        with scandir("pictures") as entries:
+            top_level = [(entry.path, entry.name, entry.is_dir()) for entry in entries]
+        for user_path, name, is_dir in top_level:
+            if not is_dir:
+                local_pics_data[name[:-4]] = user_path
+                continue
+            cached = index["dirs"].get(user_path)
+            if cached and is_directory_unchanged(cached["mtimes"]):
+                user_dirs[user_path] = cached
+            else:
+                files, dir_mtimes = scan_user_picture_directory(user_path)
+                user_dirs[user_path] = {"files": files, "mtimes": dir_mtimes}
+            local_pics_data.update(user_dirs[user_path]["files"])
+    index["dirs"] = user_dirs
+    save_reconcile_index(index_file, index)
+    if index_file == RECONCILE_INDEX and index["seq"] is not None:
+        # the default index has read the log, other index files
+        # fall back to a full scan once their changes are pruned
+        pictures.prune_change_log(table)(index["seq"])
     # cross checks to find which files are missing
     missing_from_db = [{"picture_path":pic_path, "picture_id":pic_id} for pic_id, pic_path
-                       in local_pics_data.items()
-                       if pic_id not in db_pics_data.keys()]
+                       in sorted(local_pics_data.items())
+                       if pic_id not in db_pics_data]
     missing_from_local = [{"picture_path":pic_path, "picture_id":pic_id} for pic_id, pic_path
-                          in db_pics_data.items()
-                          if pic_id not in local_pics_data.keys()]
+                          in sorted(db_pics_data.items())
+                          if pic_id not in local_pics_data]
     return missing_from_db, missing_from_local
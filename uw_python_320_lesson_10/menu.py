@@ -16,7 +16,10 @@ def load_users():
     Loads user accounts from a file
     '''
     filename = input('Enter filename of user file: ')
-    main.load_users(filename, user_table)
+    report = main.load_users_bulk(filename, user_table)
+    if report:
+        print(f"Loaded {report['loaded']} users, skipped {report['duplicates']} duplicates "
+              f"and {report['invalid']} invalid rows")
 
 
 def load_status_updates():
@@ -24,7 +27,12 @@ def load_status_updates():
     Loads status updates from a file
     '''
     filename = input('Enter filename for status file: ')
-    main.load_status_updates(filename, table_status=status_table, table_users=user_table)
+    report = main.load_status_updates_bulk(filename, table_status=status_table,
+                                           table_users=user_table)
+    if report:
+        print(f"Loaded {report['loaded']} statuses, skipped {report['duplicates']} duplicates, "
+              f"{report['orphaned']} statuses of unknown users "
+              f"and {report['invalid']} invalid rows")
 
 
 def add_user():
@@ -246,18 +254,19 @@ def save_pictures():
     """
     Saves all pictures in the db
     """
-    main.save_all_pictures(picture_table)
+    report = main.save_all_pictures_batched(picture_table)
+    print(f"Created {report['created']} pictures, skipped {report['skipped']} existing pictures")
 
 def list_user_pictures():
     """
     Lists all pictures for a user
     """
     user_id = input("User ID: ")
-    pictures = main.get_all_user_pictures(user_id)
-    if pictures:
-        for picture in pictures:
-            print(picture)
-    else:
+    found = False
+    for picture in main.get_all_user_pictures(user_id) or []:
+        print(picture)
+        found = True
+    if not found:
         print("No pictures found for user")
 
 def reconcile_pictures():
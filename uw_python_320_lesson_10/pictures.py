@@ -3,17 +3,80 @@ Functions for picture information for the social network project
 '''
 # pylint: disable=R0903
 from sqlite3 import IntegrityError as IntegrityError2
+from threading import Lock
 from loguru import logger
-from peewee import IntegrityError
+from peewee import CharField, CompositeKey, ForeignKeyField, IntegrityError, Model, fn
+from pragma_profiles import get_database
 
+# number of picture ids reserved from the db at a time
+KEY_BLOCK_SIZE = 100
+# (database, table) -> (next free id, end of the reserved block)
+_key_blocks = {}
+_key_lock = Lock()
+# events logged on a pictures table, and the rows whose picture_id is logged
+CHANGE_EVENTS = (("insert", ["NEW"]), ("update", ["OLD", "NEW"]), ("delete", ["OLD"]))
+
+
+def deconstruct_tags(tags):
+    '''
+    Deconstructs a string tags into a list of tags
+    '''
+    # add extra space at start so split works
+    tags = " " + tags
+    tags_list = tags.split(" #")
+    # first slot will be empty so skip it and return sorted list
+    return sorted(tags_list[1:])
+
+def create_tag_table(db):
+    '''
+    creates the tag index table of a pictures table, with the same
+    key and index as socialnetwork_model.PictureTags
+    '''
+    class Meta:
+        '''Table options for the tag index'''
+        database = get_database(db)
+        table_name = f"{db.name}_tags"
+        primary_key = CompositeKey("picture_id", "tag")
+        indexes = ((("tag", "picture_id"), False),)
+    tag_model = type("PictureTags", (Model,), {
+        # the composite key already indexes picture_id
+        "picture_id": ForeignKeyField(db.model_class, on_delete="CASCADE", index=False),
+        "tag": CharField(max_length=100),
+        "Meta": Meta})
+    tag_model.create_table()
+
+def get_tag_table(db):
+    '''
+    returns the tag index table that belongs to a pictures table
+
+    A missing table is created here, DataSet would create one with
+    only an id column.
+    '''
+    name = f"{db.name}_tags"
+    if name not in db.dataset.tables:
+        create_tag_table(db)
+    return db.dataset[name]
+
+def get_tag_rows(picture_id, tags):
+    '''
+    returns one tag index row per unique tag of a picture
+    '''
+    return [{"picture_id": picture_id, "tag": tag}
+            for tag in sorted(set(deconstruct_tags(tags)))]
 
 def add_picture(db):
     '''
     add a new picture to the collection
     '''
+    tag_table = get_tag_table(db)
     def add(**kwargs):
         try:
-            return db.insert(**kwargs)
+            with db.dataset.transaction():
+                result = db.insert(**kwargs)
+                tag_rows = get_tag_rows(kwargs.get("picture_id"), kwargs.get("tags", ""))
+                if tag_rows:
+                    tag_table.model_class.insert_many(tag_rows).execute()
+                return result
         except (IntegrityError, IntegrityError2):
             print(f"Picture ID {kwargs.get('picture_id')} already exists")
             return False
@@ -23,9 +86,17 @@ def modify_picture(db):
     '''
     modifies a picture message
     '''
+    tag_table = get_tag_table(db)
     def modify(**kwargs):
         try:
-            return db.update(**kwargs)
+            with db.dataset.transaction():
+                result = db.update(**kwargs)
+                if result and "tags" in kwargs:
+                    tag_table.delete(picture_id=kwargs["picture_id"])
+                    tag_rows = get_tag_rows(kwargs["picture_id"], kwargs["tags"])
+                    if tag_rows:
+                        tag_table.model_class.insert_many(tag_rows).execute()
+                return result
         except KeyError:
             return False
     return modify
@@ -34,9 +105,15 @@ def delete_picture(db):
     '''
     deletes the picture
     '''
+    tag_table = get_tag_table(db)
     def delete(**kwargs):
         try:
-            return db.delete(**kwargs)
+            with db.dataset.transaction():
+                picture_ids = [pic["picture_id"] for pic in db.find(**kwargs)]
+                if picture_ids:
+                    tag_model = tag_table.model_class
+                    tag_model.delete().where(tag_model.picture_id.in_(picture_ids)).execute()
+                return db.delete(**kwargs)
         except KeyError:
             return False
     return delete
@@ -52,15 +129,131 @@ def search_picture(db):
             return None
     return search
 
+def add_pictures(db):
+    '''
+    add many new pictures to the collection in one transaction
+
+    Each picture is given a freshly allocated picture_id. Another
+    process may have reserved the same ids, so if one already exists
+    the reserved block is dropped and the insert is retried once with
+    ids past a fresh MAX(picture_id). Returns the list of new picture
+    ids, or False if the insert failed.
+    '''
+    tag_model = get_tag_table(db).model_class
+    def insert(rows):
+        picture_ids = create_keys(db, len(rows))
+        new_rows = [dict(row, picture_id=picture_id)
+                    for row, picture_id in zip(rows, picture_ids)]
+        tag_rows = [tag_row for row in new_rows
+                    for tag_row in get_tag_rows(row["picture_id"], row.get("tags", ""))]
+        with db.dataset.transaction():
+            if new_rows:
+                db.model_class.insert_many(new_rows).execute()
+            if tag_rows:
+                tag_model.insert_many(tag_rows).execute()
+        return picture_ids
+    def add(rows):
+        try:
+            try:
+                return insert(rows)
+            except (IntegrityError, IntegrityError2):
+                reset_keys(db)
+                return insert(rows)
+        except (IntegrityError, IntegrityError2):
+            logger.error("Unable to add pictures, a picture ID already exists")
+            return False
+    return add
+
+def get_max_key(db):
+    '''
+    returns the highest picture id in the db as an int
+
+    Ids are compared as integers, since "100000000" sorts before
+    "99999999" as text. Ids that aren't all digits are skipped.
+    '''
+    model = db.model_class
+    max_key = (model.select(fn.MAX(model.picture_id.cast("INTEGER")))
+               .where(model.picture_id != "",
+                      fn.GLOB("*[^0-9]*", model.picture_id) == 0)
+               .scalar())
+    return int(max_key) if max_key else 0
+
+def create_keys(db, count):
+    '''
+    creates count unique PKs for pictures
+
+    Ids are handed out from a block reserved past MAX(picture_id),
+    so the table is only queried when a block runs out and threads
+    sharing this process each get their own range. The block is only
+    reserved in this process, see add_pictures for other writers.
+    '''
+    block_key = (get_database(db).database, db.name)
+    with _key_lock:
+        next_key, block_end = _key_blocks.get(block_key, (1, 1))
+        if next_key + count > block_end:
+            next_key = max(next_key, get_max_key(db) + 1)
+            block_end = next_key + max(count, KEY_BLOCK_SIZE)
+        _key_blocks[block_key] = (next_key + count, block_end)
+    return [f"{key:08}" for key in range(next_key, next_key + count)]
+
+def reset_keys(db):
+    '''
+    drops the block of picture ids reserved for a table, so the
+    next ids are reserved past a fresh MAX(picture_id)
+    '''
+    with _key_lock:
+        _key_blocks.pop((get_database(db).database, db.name), None)
+
 def create_key(db):
     '''
     creates a unique PK for a picture
     '''
-    num_of_pics = len(get_all_pictures(db))
-    picture_id = f"{(num_of_pics+1):08}"
-    while search_picture(db)(picture_id=picture_id):
-        picture_id = f"{(num_of_pics+1):08}"
-    return picture_id
+    return create_keys(db, 1)[0]
+
+def get_pictures_page(db):
+    '''
+    get one page of pictures ordered by picture_id
+
+    Only pictures with a picture_id after the given cursor are
+    returned, with the LIMIT applied in SQL.
+    '''
+    def page(after=None, limit=50):
+        model = db.model_class
+        query = model.select().order_by(model.picture_id).limit(limit)
+        if after is not None:
+            query = query.where(model.picture_id > after)
+        return list(query.dicts())
+    return page
+
+def search_pictures_by_tags(db):
+    '''
+    find pictures by tag using the tag index
+
+    Pictures must have every tag in all_of and at least one tag
+    in any_of. Results are ordered by picture_id, starting after
+    the given cursor.
+    '''
+    tag_model = get_tag_table(db).model_class
+    def search(all_of=None, any_of=None, after=None, limit=None):
+        model = db.model_class
+        query = model.select().order_by(model.picture_id)
+        if all_of:
+            all_of = set(all_of)
+            matching = (tag_model.select(tag_model.picture_id)
+                        .where(tag_model.tag.in_(list(all_of)))
+                        .group_by(tag_model.picture_id)
+                        .having(fn.COUNT(tag_model.tag) == len(all_of)))
+            query = query.where(model.picture_id.in_(matching))
+        if any_of:
+            matching = (tag_model.select(tag_model.picture_id)
+                        .where(tag_model.tag.in_(list(set(any_of)))))
+            query = query.where(model.picture_id.in_(matching))
+        if after is not None:
+            query = query.where(model.picture_id > after)
+        if limit is not None:
+            query = query.limit(limit)
+        return list(query.dicts())
+    return search
 
 def get_all_pictures(db):
     '''
@@ -68,3 +261,100 @@ def get_all_pictures(db):
     '''
     pics = db.find()
     return pics
+
+def get_pictures_by_ids(db):
+    '''
+    get every picture whose picture_id is in picture_ids
+    '''
+    def search(picture_ids):
+        picture_ids = list(picture_ids)
+        if not picture_ids:
+            return []
+        model = db.model_class
+        return list(model.select().where(model.picture_id.in_(picture_ids)).dicts())
+    return search
+
+def change_log_name(table_name):
+    '''
+    name of the table recording changes to a pictures table
+    '''
+    return f"{table_name}_changes"
+
+def install_change_log(database, table_name):
+    '''
+    creates the change log of a pictures table and the triggers that
+    record the picture_id of every insert, update and delete in it
+
+    Runs when the tables are set up, never on a read. Changes made
+    before it ran are not in the log.
+    '''
+    log = change_log_name(table_name)
+    database.execute_sql(f'CREATE TABLE IF NOT EXISTS "{log}" '
+                         "(seq INTEGER PRIMARY KEY AUTOINCREMENT, picture_id TEXT NOT NULL)")
+    for event, rows in CHANGE_EVENTS:
+        inserts = " ".join(f'INSERT INTO "{log}" (picture_id) VALUES ({row}.picture_id);'
+                           for row in rows)
+        database.execute_sql(f'CREATE TRIGGER IF NOT EXISTS "{log}_{event}" '
+                             f'AFTER {event.upper()} ON "{table_name}" BEGIN {inserts} END')
+
+def has_change_log(db):
+    '''
+    checks that triggers are recording changes to the pictures table
+    '''
+    log = change_log_name(db.name)
+    cursor = get_database(db).execute_sql(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+        tuple(f"{log}_{event}" for event, _ in CHANGE_EVENTS))
+    return cursor.fetchone()[0] == len(CHANGE_EVENTS)
+
+def get_last_change(db):
+    '''
+    returns the sequence number of the newest logged change
+
+    The number is read from sqlite_sequence, so it is still known
+    after the log has been pruned.
+    '''
+    database = get_database(db)
+    cursor = database.execute_sql("SELECT seq FROM sqlite_sequence WHERE name = ?",
+                                  (change_log_name(db.name),))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def get_changed_pictures(db):
+    '''
+    returns the picture ids changed after a logged sequence number
+    and the newest sequence number
+
+    Reading does not change the log, so each reader can keep its own
+    sequence number. Returns None if entries after that number were
+    pruned, or if the number is newer than the log.
+    '''
+    def changes(after_seq):
+        database = get_database(db)
+        log = change_log_name(db.name)
+        with db.dataset.transaction():
+            last_seq = get_last_change(db)
+            first_seq = database.execute_sql(f'SELECT MIN(seq) FROM "{log}"').fetchone()[0]
+            if first_seq is None:
+                first_seq = last_seq + 1
+            if not first_seq - 1 <= after_seq <= last_seq:
+                return None
+            rows = database.execute_sql(
+                f'SELECT picture_id FROM "{log}" WHERE seq > ? AND seq <= ?',
+                (after_seq, last_seq)).fetchall()
+        return {picture_id for picture_id, in rows}, last_seq
+    return changes
+
+def prune_change_log(db):
+    '''
+    removes logged changes up to a sequence number
+
+    Readers whose sequence number is older than that have to be
+    rebuilt, get_changed_pictures returns None for them.
+    '''
+    def prune(upto_seq):
+        database = get_database(db)
+        cursor = database.execute_sql(f'DELETE FROM "{change_log_name(db.name)}" WHERE seq <= ?',
+                                      (upto_seq,))
+        return cursor.rowcount
+    return prune
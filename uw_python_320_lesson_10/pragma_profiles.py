@@ -0,0 +1,68 @@
+"""
+Named sqlite pragma profiles for the social network database
+"""
+from contextlib import contextmanager
+
+PROFILES = {
+    # safest settings, every commit is synced to disk
+    "durable": {"journal_mode": "wal",
+                "synchronous": 2,
+                "cache_size": -2000,
+                "mmap_size": 0,
+                "temp_store": 0},
+    # many readers and one writer behind the flask api
+    "serving": {"journal_mode": "wal",
+                "synchronous": 1,
+                "cache_size": -64000,
+                "mmap_size": 268435456,
+                "temp_store": 2,
+                "busy_timeout": 5000},
+    # large loads from csv files, a crash may lose the last commits
+    "bulk_load": {"journal_mode": "wal",
+                  "synchronous": 0,
+                  "cache_size": -256000,
+                  "mmap_size": 268435456,
+                  "temp_store": 2},
+}
+
+# journal_mode is persistent in the database file and needs exclusive
+# access to change, so it is only set when a database is created
+SWITCHABLE_PRAGMAS = ("synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+def get_pragmas(profile):
+    """
+    Returns the pragmas of a profile, or no pragmas for None
+    """
+    if profile is None:
+        return {}
+    try:
+        return dict(PROFILES[profile])
+    except KeyError as error:
+        raise ValueError(f"Unknown pragma profile '{profile}', "
+                         f"choose from {sorted(PROFILES)}") from error
+
+
+def get_database(table):
+    """
+    Returns the peewee database behind a dataset table
+    """
+    return table.dataset._database  # pylint: disable=W0212
+
+
+@contextmanager
+def use_profile(database, profile):
+    """
+    Switches a database connection to a profile and restores the
+    previous pragma values afterwards
+    """
+    pragmas = {key: value for key, value in get_pragmas(profile).items()
+               if key in SWITCHABLE_PRAGMAS}
+    previous = {key: database.pragma(key) for key in pragmas}
+    for key, value in pragmas.items():
+        database.pragma(key, value)
+    try:
+        yield database
+    finally:
+        for key, value in previous.items():
+            database.pragma(key, value)
@@ -1,8 +1,14 @@
 """Social network app schema"""
-from peewee import SqliteDatabase, Model, CharField, ForeignKeyField
+import os
+from peewee import SqliteDatabase, Model, CharField, ForeignKeyField, CompositeKey
+from pictures import get_tag_rows, install_change_log
+from pragma_profiles import get_pragmas
 # pylint: disable=R0903
+# pragma profile from pragma_profiles, sqlite defaults if not set
+PROFILE = os.environ.get("SOCIALNETWORK_PROFILE")
 # Connect to SQLite and ensure foreign_keys are enforced
-database = SqliteDatabase("socialnetwork.db", pragmas={"foreign_keys": 1})
+database = SqliteDatabase("socialnetwork.db",
+                          pragmas={"foreign_keys": 1, **get_pragmas(PROFILE)})
 database.connect()
 
 # This base class will automatically bind our models to the sqlite database we're creating
@@ -34,7 +40,29 @@ class Pictures(BaseModel):
     user_id = ForeignKeyField(Users, backref="picture", on_delete="CASCADE")
     tags = CharField(max_length=100)
 
+
+class PictureTags(BaseModel):
+    """Tag index for pictures, one row per tag of each picture"""
+    picture_id = ForeignKeyField(Pictures, backref="tag_index", on_delete="CASCADE")
+    tag = CharField(max_length=100)
+
+    class Meta:
+        """Table options for the tag index"""
+        table_name = "pictures_tags"
+        primary_key = CompositeKey("picture_id", "tag")
+        indexes = ((("tag", "picture_id"), False),)
+
 # Creates the table
-database.create_tables([Users, Status, Pictures])
+backfill_tags = not database.table_exists(PictureTags)
+database.create_tables([Users, Status, Pictures, PictureTags])
+# log picture changes so reconcile_pictures can skip unchanged pictures
+install_change_log(database, Pictures._meta.table_name)
+if backfill_tags:
+    # index tags of pictures added before the tag index existed
+    with database.atomic():
+        for picture in Pictures.select().tuples().iterator():
+            tag_rows = get_tag_rows(picture[0], picture[2])
+            if tag_rows:
+                PictureTags.insert_many(tag_rows).execute()
 
 database.close()
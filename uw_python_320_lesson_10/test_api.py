@@ -0,0 +1,117 @@
+"""
+Tests the flask endpoints from api.py
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+from playhouse.dataset import DataSet
+import api
+from connection import ConnectionPool
+from test_database_model import create_tables, close_connection, drop_tables
+
+
+ds = DataSet('sqlite:///test_database.db')
+test_user_table = ds['testusers']
+test_status_table = ds['teststatus']
+test_picture_table = ds['testpictures']
+
+
+class TestApi(TestCase):
+    """Class for testing api.py"""
+
+    def setUp(self):
+        create_tables()
+        api.pool = ConnectionPool(size=2, database_file="test_database.db",
+                                  table_names=("testusers", "teststatus", "testpictures"))
+        self.client = api.app.test_client()
+        for user_id in ["bcrusher", "jlpicard", "wriker"]:
+            test_user_table.insert(user_id=user_id,
+                                   user_email=f"{user_id}@enterprise.com",
+                                   user_name=user_id,
+                                   user_last_name=user_id)
+
+    def tearDown(self):
+        api.pool.close_all()
+        drop_tables()
+        close_connection()
+
+    def test_users_pagination(self):
+        """Tests /users pages through users with the next cursor"""
+        first_page = self.client.get("/users?limit=2").get_json()
+        self.assertEqual([user["user_id"] for user in first_page["users"]],
+                         ["bcrusher", "jlpicard"])
+        self.assertEqual(first_page["next_after"], "jlpicard")
+        second_page = self.client.get("/users?limit=2&after=jlpicard").get_json()
+        self.assertEqual([user["user_id"] for user in second_page["users"]], ["wriker"])
+        self.assertIsNone(second_page["next_after"])
+
+    def test_users_ndjson(self):
+        """Tests /users?format=ndjson streams every user"""
+        response = self.client.get("/users?format=ndjson")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)["user_id"] for line in lines],
+                         ["bcrusher", "jlpicard", "wriker"])
+
+    def test_users_include_statuses(self):
+        """Tests /users?include=statuses groups statuses under each user"""
+        test_status_table.insert(status_id="wriker001", user_id="wriker", status_text="Red alert!")
+        test_status_table.insert(status_id="wriker002", user_id="wriker", status_text="Engage")
+        users = self.client.get("/users?include=statuses").get_json()["users"]
+        statuses = {user["user_id"]: [status["status_id"] for status in user["statuses"]]
+                    for user in users}
+        self.assertEqual(statuses, {"bcrusher": [], "jlpicard": [],
+                                    "wriker": ["wriker001", "wriker002"]})
+
+    def test_user_statuses(self):
+        """Tests /users/<id>/statuses"""
+        test_status_table.insert(status_id="wriker001", user_id="wriker", status_text="Red alert!")
+        statuses = self.client.get("/users/wriker/statuses").get_json()
+        self.assertEqual(statuses, [{"status_id": "wriker001", "user_id": "wriker",
+                                     "status_text": "Red alert!"}])
+        self.assertEqual(self.client.get("/users/jlpicard/statuses").get_json(), [])
+
+    def test_images_empty(self):
+        """Tests /images returns an empty page when there are no pictures"""
+        page = self.client.get("/images").get_json()
+        self.assertEqual(page, {"pictures": [], "next_after": None})
+
+    def test_images_by_tag(self):
+        """Tests /images?tag= uses the tag index"""
+        picture_ids = api.main.add_pictures([("wriker", "#bridge #red"), ("wriker", "#bridge"),
+                                             ("jlpicard", "#red")],
+                                            test_user_table, test_picture_table)
+        def found(query):
+            page = self.client.get(f"/images?{query}").get_json()
+            return [picture["picture_id"] for picture in page["pictures"]]
+        self.assertEqual(found("tag=bridge"), picture_ids[:2])
+        self.assertEqual(found("tag=bridge&tag=red"), picture_ids[:1])
+        self.assertEqual(found("any_tag=red&any_tag=none"), [picture_ids[0], picture_ids[2]])
+        self.assertEqual(found("tag=none"), [])
+
+    def test_concurrent_requests(self):
+        """Tests threaded requests share the pool without locking errors"""
+        def get_users(_):
+            return api.app.test_client().get("/users?include=statuses").status_code
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            status_codes = list(executor.map(get_users, range(32)))
+        self.assertEqual(status_codes, [200] * 32)
+        self.assertLessEqual(api.pool._opened, 2)
+
+    def test_pool_timeout(self):
+        """Tests a request gets a 503 when no connection is released in time"""
+        busy = [api.pool.acquire(), api.pool.acquire()]
+        with patch.object(api, "POOL_TIMEOUT", 0.01):
+            response = self.client.get("/users")
+        for connection in busy:
+            api.pool.release(connection)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get("/users").status_code, 200)
+
+    def test_pool_open_failure(self):
+        """Tests a connection that fails to open gives its slot back to the pool"""
+        with patch("connection.Connection", side_effect=OSError("unable to open")):
+            with self.assertRaises(OSError):
+                api.pool.acquire()
+        self.assertEqual(api.pool._opened, 0)
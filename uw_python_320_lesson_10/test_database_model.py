@@ -1,4 +1,5 @@
-from peewee import SqliteDatabase, Model, CharField, ForeignKeyField
+from peewee import SqliteDatabase, Model, CharField, ForeignKeyField, CompositeKey
+from pictures import install_change_log
 
 # Connect to SQLite and ensure foreign_keys are enforced
 test_database = SqliteDatabase("test_database.db", pragmas={"foreign_keys": 1})
@@ -25,13 +26,30 @@ class TestStatus(BaseModel):
     status_text = CharField()
 
 
+class TestPictures(BaseModel):
+    picture_id = CharField(primary_key=True, max_length=30)
+    user_id = ForeignKeyField(TestUsers, backref='picture', on_delete='CASCADE')
+    tags = CharField(max_length=100)
+
+
+class TestPictureTags(BaseModel):
+    picture_id = ForeignKeyField(TestPictures, backref='tag_index', on_delete='CASCADE')
+    tag = CharField(max_length=100)
+
+    class Meta:
+        table_name = "testpictures_tags"
+        primary_key = CompositeKey("picture_id", "tag")
+        indexes = ((("tag", "picture_id"), False),)
+
+
 def drop_tables():
-    test_database.drop_tables([TestUsers, TestStatus])
+    test_database.drop_tables([TestUsers, TestStatus, TestPictures, TestPictureTags])
 
 
 def create_tables():
-    test_database.create_tables([TestUsers, TestStatus])
-    test_database.bind([TestUsers, TestStatus])
+    test_database.create_tables([TestUsers, TestStatus, TestPictures, TestPictureTags])
+    test_database.bind([TestUsers, TestStatus, TestPictures, TestPictureTags])
+    install_change_log(test_database, TestPictures._meta.table_name)
 
 
 def close_connection():
@@ -39,7 +57,7 @@ def close_connection():
 
 
 # Creates the table
-test_database.drop_tables([TestUsers, TestStatus])
-test_database.create_tables([TestUsers, TestStatus])
+test_database.drop_tables([TestUsers, TestStatus, TestPictures, TestPictureTags])
+test_database.create_tables([TestUsers, TestStatus, TestPictures, TestPictureTags])
 
 test_database.close()
\ No newline at end of file
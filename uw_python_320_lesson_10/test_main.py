@@ -2,10 +2,13 @@
 Tests methods from main.py
 """
 import io
+import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import Mock, patch, mock_open
 from peewee import SqliteDatabase
 import main
+import pictures
 import users
 import user_status
 from playhouse.dataset import DataSet
@@ -20,6 +23,7 @@ from test_database_model import create_tables, close_connection, drop_tables
 ds = DataSet('sqlite:///test_database.db')
 test_status_table = ds['teststatus']
 test_user_table = ds['testusers']
+test_picture_table = ds['testpictures']
 
 
 class TestMain(TestCase):
@@ -40,6 +44,20 @@ class TestMain(TestCase):
         self.assertEqual(janeway['user_name'], "Katherine")
         self.assertEqual(janeway['user_last_name'], "Janeway")
 
+    def test_load_users_restores_pragmas(self):
+        """Tests main.load_users() only uses the bulk load profile while loading"""
+        database = ds._database
+        synchronous = database.pragma("synchronous")
+        loading_synchronous = []
+        add_user = users.add_user
+        def add_user_checking_pragmas(table):
+            loading_synchronous.append(database.pragma("synchronous"))
+            return add_user(table)
+        with patch('users.add_user', side_effect=add_user_checking_pragmas):
+            main.load_users("test_accounts.csv", table=test_user_table)
+        self.assertEqual(loading_synchronous, [0, 0])
+        self.assertEqual(database.pragma("synchronous"), synchronous)
+
     def test_load_users_file_not_found(self):
         """Tests main.load_users() FileNotFound error"""
         with patch('sys.stdout', new_callable=io.StringIO) as mock_stdout:
@@ -59,6 +77,61 @@ class TestMain(TestCase):
         main.load_users("test_accounts.csv", table=test_user_table)
         self.assertEqual(len(test_user_table), 2)
 
+    def test_load_users_bulk(self):
+        """Tests main.load_users_bulk() with a duplicate user"""
+        test_user_table.insert(user_id="bcrusher",
+                               user_email="bcrusher@enterprise.com",
+                               user_name="beverly",
+                               user_last_name="crusher")
+        report = main.load_users_bulk("test_accounts.csv", table=test_user_table, chunk_size=1)
+        self.assertEqual(report, {"loaded": 1, "duplicates": 1, "invalid": 0})
+        self.assertEqual(len(test_user_table), 2)
+        janeway = test_user_table.find_one(user_id="kjaneway")
+        self.assertEqual(janeway['user_email'], "kjaneway@voyager.com")
+
+    def test_load_users_bulk_invalid_rows(self):
+        """Tests main.load_users_bulk() reports rows with empty fields as invalid"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, "accounts.csv")
+            with open(file_name, "w", encoding="utf-8") as csv_file:
+                csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\n"
+                               "wriker,William,Riker,wriker@enterprise.com\n"
+                               "jlpicard,,Picard,jlpicard@enterprise.com\n"
+                               "dtroi,Deanna\n")
+            report = main.load_users_bulk(file_name, table=test_user_table)
+        self.assertEqual(report, {"loaded": 1, "duplicates": 0, "invalid": 2})
+        self.assertEqual(len(test_user_table), 1)
+
+    def test_get_bulk_chunk_size(self):
+        """Tests main.get_bulk_chunk_size() stays under sqlite's variable limit"""
+        self.assertEqual(main.get_bulk_chunk_size(test_user_table, chunk_size=10), 10)
+        connection = Mock()
+        connection.getlimit.side_effect = AttributeError
+        with patch.object(ds._database, "connection", return_value=connection):
+            # 999 variables over the 4 user columns
+            self.assertEqual(main.get_bulk_chunk_size(test_user_table), 249)
+
+    def test_load_users_bulk_file_not_found(self):
+        """Tests main.load_users_bulk() FileNotFound error"""
+        with patch('sys.stdout', new_callable=io.StringIO):
+            self.assertFalse(main.load_users_bulk("no_file.csv", table=test_user_table))
+
+    def test_load_status_updates_bulk(self):
+        """Tests main.load_status_updates_bulk with an orphaned and duplicate status"""
+        test_user_table.insert(user_id="bcrusher",
+                               user_email="bcrusher@enterprise.com",
+                               user_name="beverly",
+                               user_last_name="crusher")
+        report = main.load_status_updates_bulk("test_status_updates.csv",
+                                               table_status=test_status_table,
+                                               table_users=test_user_table)
+        self.assertEqual(report, {"loaded": 1, "duplicates": 0, "orphaned": 1, "invalid": 0})
+        report = main.load_status_updates_bulk("test_status_updates.csv",
+                                               table_status=test_status_table,
+                                               table_users=test_user_table)
+        self.assertEqual(report, {"loaded": 0, "duplicates": 1, "orphaned": 1, "invalid": 0})
+        crusher_status = test_status_table.find_one(status_id="brcusher001")
+        self.assertEqual(crusher_status["status_text"], "Medical emergency on deck 4")
 
     def test_load_status_updates(self):
         """Tests main.load_status_updates with mock data"""
@@ -227,3 +300,253 @@ class TestMain(TestCase):
                         table_status=test_status_table,
                         table_users=test_user_table)
         self.assertTrue(main.search_status(status_id="wriker001", table=test_status_table))
+
+    def test_add_picture(self):
+        """Tests main.add_picture() allocates increasing ids"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        first_id = main.add_picture("wriker", "#bridge", test_user_table, test_picture_table)
+        second_id = main.add_picture("wriker", "#bridge", test_user_table, test_picture_table)
+        self.assertEqual(int(second_id), int(first_id) + 1)
+        self.assertEqual(sorted(pic["picture_id"] for pic in test_picture_table.find()),
+                         [first_id, second_id])
+
+    def test_add_picture_reserved_by_another_process(self):
+        """Tests main.add_picture() retries when another process used the same ids"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        first_id = main.add_picture("wriker", "#bridge", test_user_table, test_picture_table)
+        # a second process reserves its block from the same MAX(picture_id)
+        saved_blocks = dict(pictures._key_blocks)
+        pictures._key_blocks.clear()
+        other_id = main.add_picture("wriker", "#ten", test_user_table, test_picture_table)
+        pictures._key_blocks.update(saved_blocks)
+        second_id = main.add_picture("wriker", "#bridge", test_user_table, test_picture_table)
+        self.assertEqual(int(other_id), int(first_id) + 1)
+        self.assertEqual(int(second_id), int(other_id) + 1)
+        self.assertEqual(sorted(pic["picture_id"] for pic in test_picture_table.find()),
+                         sorted([first_id, other_id, second_id]))
+
+    def test_get_max_key(self):
+        """Tests pictures.get_max_key() compares ids as numbers and skips other ids"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        self.assertEqual(pictures.get_max_key(test_picture_table), 0)
+        for picture_id in ["99999999", "100000000", "wriker_pic"]:
+            test_picture_table.insert(picture_id=picture_id, user_id="wriker", tags="#a")
+        self.assertEqual(pictures.get_max_key(test_picture_table), 100000000)
+
+    def test_add_pictures(self):
+        """Tests main.add_pictures() adds a batch with unique ids"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        picture_ids = main.add_pictures([("wriker", "#a"), ("wriker", "#b #c")],
+                                        test_user_table, test_picture_table)
+        self.assertEqual(len(set(picture_ids)), 2)
+        self.assertEqual(test_picture_table.find_one(picture_id=picture_ids[1])["tags"], "#b #c")
+
+    def test_add_pictures_user_does_not_exist(self):
+        """Tests main.add_pictures() when a user does not exist"""
+        with patch('sys.stdout', new_callable=io.StringIO):
+            self.assertFalse(main.add_pictures([("rando", "#a")],
+                                               test_user_table, test_picture_table))
+        self.assertEqual(len(test_picture_table), 0)
+
+    def test_reconcile_pictures_incremental(self):
+        """Tests main.reconcile_pictures() reuses its index and matches a full scan"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                index_file = "test_index.json"
+                saved_id = main.add_pictures([("wriker", "#bridge")], test_user_table,
+                                             test_picture_table)[0]
+                main.save_all_pictures(test_picture_table)
+                self.assertEqual(main.reconcile_pictures(test_picture_table, full=True,
+                                                         index_file=index_file), ([], []))
+                # change the db and the file system after the index was saved
+                db_only_id = main.add_pictures([("wriker", "#bridge")], test_user_table,
+                                               test_picture_table)[0]
+                open(os.path.join("pictures", "wriker", "bridge", "99999999.png"),
+                     "w", encoding="utf-8").close()
+                main.delete_picture(saved_id, test_picture_table)
+                incremental = main.reconcile_pictures(test_picture_table, index_file=index_file)
+                full = main.reconcile_pictures(test_picture_table, full=True,
+                                               index_file=index_file)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(incremental, full)
+        missing_from_db, missing_from_local = incremental
+        self.assertEqual([pic["picture_id"] for pic in missing_from_db],
+                         [saved_id, "99999999"])
+        self.assertEqual([pic["picture_id"] for pic in missing_from_local],
+                         [db_only_id])
+
+    def test_reconcile_pictures_two_indexes(self):
+        """Tests main.reconcile_pictures() with two index files reading the change log"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                main.reconcile_pictures(test_picture_table, index_file="a.json")
+                main.reconcile_pictures(test_picture_table, index_file="b.json")
+                new_id = main.add_picture("wriker", "#bridge", test_user_table,
+                                          test_picture_table)
+                from_b = main.reconcile_pictures(test_picture_table, index_file="b.json")
+                from_a = main.reconcile_pictures(test_picture_table, index_file="a.json")
+                # a.json has read every change, b.json is rebuilt after pruning
+                main.add_picture("wriker", "#bridge", test_user_table, test_picture_table)
+                main.reconcile_pictures(test_picture_table, index_file="a.json")
+                pruned = main.prune_reconcile_log(test_picture_table, ["a.json"])
+                after_prune = main.reconcile_pictures(test_picture_table, index_file="b.json")
+                full = main.reconcile_pictures(test_picture_table, full=True,
+                                               index_file="b.json")
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(from_a, from_b)
+        self.assertEqual([pic["picture_id"] for pic in from_a[1]], [new_id])
+        self.assertGreater(pruned, 0)
+        self.assertEqual(after_prune, full)
+        self.assertEqual(len(full[1]), 2)
+
+    def test_reconcile_pictures_prunes_default_index(self):
+        """Tests main.reconcile_pictures() prunes the log read by the default index"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        log_table = ds[pictures.change_log_name("testpictures")]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                main.reconcile_pictures(test_picture_table)
+                new_id = main.add_picture("wriker", "#bridge", test_user_table,
+                                          test_picture_table)
+                self.assertGreater(len(log_table), 0)
+                _, missing_from_local = main.reconcile_pictures(test_picture_table)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual([pic["picture_id"] for pic in missing_from_local], [new_id])
+        self.assertEqual(len(log_table), 0)
+
+    def test_reconcile_pictures_without_change_log(self):
+        """Tests main.reconcile_pictures() does not install the change log on a read"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        for event, _ in pictures.CHANGE_EVENTS:
+            ds.query(f'DROP TRIGGER "testpictures_changes_{event}"')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                main.reconcile_pictures(test_picture_table, index_file="index.json")
+                new_id = main.add_picture("wriker", "#bridge", test_user_table,
+                                          test_picture_table)
+                _, missing_from_local = main.reconcile_pictures(test_picture_table,
+                                                                index_file="index.json")
+            finally:
+                os.chdir(cwd)
+        self.assertFalse(pictures.has_change_log(test_picture_table))
+        self.assertEqual([pic["picture_id"] for pic in missing_from_local], [new_id])
+
+    def test_get_all_user_pictures(self):
+        """Tests main.get_all_user_pictures() walks nested tag directories"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                deep_path = os.path.join("pictures", "wriker", *[f"tag{num}" for num in range(50)])
+                os.makedirs(deep_path)
+                os.makedirs(os.path.join("pictures", "jlpicard"))
+                open(os.path.join(deep_path, "00000001.png"), "w", encoding="utf-8").close()
+                open(os.path.join("pictures", "jlpicard", "00000002.png"),
+                     "w", encoding="utf-8").close()
+                # a link back up the tree is not followed
+                os.symlink(os.path.abspath("pictures"), os.path.join(deep_path, "loop"))
+                user_pictures = list(main.get_all_user_pictures("wriker"))
+                all_pictures = list(main.get_all_user_pictures(""))
+                no_pictures = main.get_all_user_pictures("rando")
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(user_pictures, [(deep_path, os.path.join(deep_path, "00000001.png"),
+                                          "00000001.png")])
+        self.assertEqual(sorted(picture[2] for picture in all_pictures),
+                         ["00000001.png", "00000002.png"])
+        self.assertIsNone(no_pictures)
+
+    def test_save_all_pictures_batched(self):
+        """Tests main.save_all_pictures_batched() skips files that already exist"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        picture_ids = main.add_pictures([("wriker", "#bridge"), ("wriker", "#bridge"),
+                                         ("wriker", "#ten #forward")],
+                                        test_user_table, test_picture_table)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cwd = os.getcwd()
+            os.chdir(temp_dir)
+            try:
+                first_run = main.save_all_pictures_batched(test_picture_table)
+                second_run = main.save_all_pictures_batched(test_picture_table)
+                saved = os.path.isfile(os.path.join("pictures", "wriker", "forward", "ten",
+                                                    f"{picture_ids[2]}.png"))
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(first_run, {"created": 3, "skipped": 0})
+        self.assertEqual(second_run, {"created": 0, "skipped": 3})
+        self.assertTrue(saved)
+
+    def test_missing_tag_table(self):
+        """Tests a missing tag index table is created with its key and index"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        ds.query('DROP TABLE "testpictures_tags"')
+        ds.update_cache()
+        picture_ids = main.add_pictures([("wriker", "#bridge #red")], test_user_table,
+                                        test_picture_table)
+        self.assertEqual(ds["testpictures_tags"].columns, ["picture_id", "tag"])
+        self.assertIn(["tag", "picture_id"],
+                      [index.columns for index in ds._database.get_indexes("testpictures_tags")])
+        self.assertEqual(main.search_pictures_by_tags(test_picture_table, all_of=["red"]),
+                         [{"picture_id": picture_ids[0], "user_id": "wriker",
+                           "tags": "#bridge #red"}])
+
+    def test_picture_tags_in_sync(self):
+        """Tests the tag index follows main.update_picture() and main.delete_picture()"""
+        test_user_table.insert(user_id="wriker",
+                               user_email="wriker@enterprise.com",
+                               user_name="William",
+                               user_last_name="Riker")
+        first_id, second_id = main.add_pictures([("wriker", "#bridge #red"),
+                                                 ("wriker", "#bridge")],
+                                                test_user_table, test_picture_table)
+        self.assertTrue(main.update_picture(first_id, "wriker", "#ready #red",
+                                            test_user_table, test_picture_table))
+        main.delete_picture(second_id, test_picture_table)
+        self.assertEqual(main.search_pictures_by_tags(test_picture_table, all_of=["bridge"]), [])
+        self.assertEqual(main.search_pictures_by_tags(test_picture_table,
+                                                      all_of=["ready", "red"]),
+                         [{"picture_id": first_id, "user_id": "wriker", "tags": "#ready #red"}])
+        self.assertEqual(len(ds['testpictures_tags']), 2)
@@ -0,0 +1,33 @@
+"""
+Tests pragma profiles from pragma_profiles.py
+"""
+from unittest import TestCase
+from peewee import SqliteDatabase
+import pragma_profiles
+
+
+class TestPragmaProfiles(TestCase):
+    """Class for testing pragma_profiles.py"""
+    def setUp(self):
+        self.database = SqliteDatabase(":memory:")
+        self.database.connect()
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_get_pragmas(self):
+        """Tests pragma_profiles.get_pragmas"""
+        self.assertEqual(pragma_profiles.get_pragmas(None), {})
+        self.assertEqual(pragma_profiles.get_pragmas("serving")["journal_mode"], "wal")
+        with self.assertRaises(ValueError):
+            pragma_profiles.get_pragmas("fastest")
+
+    def test_use_profile_restores_pragmas(self):
+        """Tests pragma_profiles.use_profile switches and restores pragmas"""
+        synchronous = self.database.pragma("synchronous")
+        cache_size = self.database.pragma("cache_size")
+        with pragma_profiles.use_profile(self.database, "bulk_load"):
+            self.assertEqual(self.database.pragma("synchronous"), 0)
+            self.assertEqual(self.database.pragma("cache_size"), -256000)
+        self.assertEqual(self.database.pragma("synchronous"), synchronous)
+        self.assertEqual(self.database.pragma("cache_size"), cache_size)
@@ -25,6 +25,24 @@ def add_status(db):
     return new_status
 
 
+def add_statuses_bulk(db):
+    '''
+    add many status messages to the collection in one transaction
+
+    Any status_id that already exists is ignored. Returns the number
+    of rows that were actually inserted.
+    '''
+    def new_statuses(rows):
+        if not rows:
+            return 0
+        with db.dataset.transaction():
+            return (db.model_class.insert_many(rows)
+                    .on_conflict_ignore()
+                    .as_rowcount()
+                    .execute())
+    return new_statuses
+
+
 def modify_status(db):
     '''
     Modifies a status message
@@ -62,3 +80,25 @@ def search_status(db):
         except KeyError:
             return None
     return search
+
+
+def get_user_statuses(db):
+    '''
+    Find the status messages for many users with a single query
+
+    Returns a dict of user_id to a list of that user's statuses,
+    with an empty list for users that have none.
+    '''
+    def search(user_ids):
+        user_ids = list(user_ids)
+        statuses = {user_id: [] for user_id in user_ids}
+        if not user_ids:
+            return statuses
+        model = db.model_class
+        query = (model.select()
+                 .where(model.user_id.in_(user_ids))
+                 .order_by(model.status_id))
+        for status in query.dicts():
+            statuses[status["user_id"]].append(status)
+        return statuses
+    return search
@@ -61,6 +61,57 @@ def delete_user(db):
             return False
     return remove_user
 
+def add_users_bulk(db):
+    '''
+    Adds many users to the collection in one transaction
+
+    Any user_id that already exists is ignored. Returns the number
+    of rows that were actually inserted.
+    '''
+    def insert_users(rows):
+        if not rows:
+            return 0
+        with db.dataset.transaction():
+            return (db.model_class.insert_many(rows)
+                    .on_conflict_ignore()
+                    .as_rowcount()
+                    .execute())
+    return insert_users
+
+
+def get_all_user_ids(db):
+    """
+    Gets the set of every user_id in the table
+    """
+    model = db.model_class
+    return {user_id for (user_id,) in model.select(model.user_id).tuples()}
+
+
+def get_existing_user_ids(db):
+    """
+    Finds which of the given user_ids exist in the table
+    """
+    def existing(user_ids):
+        model = db.model_class
+        query = model.select(model.user_id).where(model.user_id.in_(list(user_ids)))
+        return {user_id for (user_id,) in query.tuples()}
+    return existing
+
+def get_users_page(db):
+    """
+    Gets one page of users ordered by user_id
+
+    Only users with a user_id after the given cursor are returned,
+    with the LIMIT applied in SQL.
+    """
+    def page(after=None, limit=50):
+        model = db.model_class
+        query = model.select().order_by(model.user_id).limit(limit)
+        if after is not None:
+            query = query.where(model.user_id > after)
+        return list(query.dicts())
+    return page
+
 def get_all_users(db):
     """
     Gets all users in the table